@@ -8,12 +8,22 @@ from collections import defaultdict
 from playwright.sync_api import sync_playwright
 import pandas as pd
 
+from context_pool import ContextPool
+from results_sink import open_sink
+
 # ================= CONFIG =================
 URL_FILE = "urls.txt"          # urls.txt or urls.csv
 TEST_DURATION_MINUTES = 30
 DELAY_BETWEEN_URLS_SEC = 5
 BUCKET_SIZE_MINUTES = 5
 
+CONTEXT_MODE = "warm"          # "warm" = reuse one context, "cold" = fresh context per sample
+CONTEXT_MAX_USES = 0           # recycle the warm context after this many samples (0 = never, as before)
+
+RESULTS_SINK = "csv"           # "csv", "csv-rotating", "parquet" or "arrow"
+SINK_FLUSH_ROWS = 500          # write raw rows in batches of this size...
+SINK_FLUSH_SECS = 10           # ...or at least this often
+
 RAW_RESULTS_FILE = "results.csv"
 SUMMARY_REPORT_FILE = "summary_report.csv"
 MERGED_BUCKET_REPORT_FILE = "bucketed_performance_report.csv"
@@ -61,26 +71,29 @@ def main():
     bucketed_load_timings = defaultdict(lambda: defaultdict(list))
     bucketed_lcp_timings = defaultdict(lambda: defaultdict(list))
 
-    with open(RAW_RESULTS_FILE, "w", newline="") as raw_file:
-        raw_writer = csv.writer(raw_file)
-        raw_writer.writerow([
+    with open_sink(
+        RESULTS_SINK, RAW_RESULTS_FILE,
+        [
             "timestamp_utc",
             "url",
             "page_load_time_ms",
             "fcp_ms",
             "lcp_ms",
             "cls"
-        ])
+        ],
+        flush_rows=SINK_FLUSH_ROWS, flush_secs=SINK_FLUSH_SECS
+    ) as raw_sink:
 
         with sync_playwright() as p:
             browser = p.chromium.launch(headless=True)
-            context = browser.new_context()
+            pool = ContextPool(browser, mode=CONTEXT_MODE, max_uses=CONTEXT_MAX_USES)
 
             while time.time() < end_time:
                 for url in urls:
                     if time.time() >= end_time:
                         break
 
+                    context = pool.acquire()
                     page = context.new_page()
                     start = time.time()
                     now = datetime.utcnow()
@@ -129,8 +142,8 @@ def main():
                     except Exception:
                         pass
 
-                    # --------- Raw CSV ----------
-                    raw_writer.writerow([
+                    # --------- Raw results ----------
+                    raw_sink.write([
                         now.isoformat(),
                         url,
                         load_time_ms,
@@ -138,7 +151,6 @@ def main():
                         int(lcp),
                         round(cls, 3)
                     ])
-                    raw_file.flush()
 
                     # --------- Store successful samples ----------
                     if load_time_ms > 0:
@@ -151,8 +163,10 @@ def main():
                             bucketed_lcp_timings[url][bucket].append(lcp)
 
                     page.close()
+                    pool.release(context)
                     time.sleep(DELAY_BETWEEN_URLS_SEC)
 
+            pool.close()
             browser.close()
 
     # ---------- Summary Report (Load Time) ----------
@@ -0,0 +1,107 @@
+from collections import deque
+from contextlib import contextmanager
+
+
+MODES = ("warm", "cold", "paired")
+
+
+class ContextPool:
+    """
+    Hands out browser contexts for probe samples.
+
+    warm   - one shared context (cookies + HTTP cache survive between samples)
+    cold   - a fresh context per sample, taken from `spares` pre-created ones
+             so creating it never lands inside the measured time
+    paired - like cold; the caller measures the same context twice to get a
+             cold and a warm sample of one URL
+
+    A reused context can be recycled after `max_uses` leases (0 = never) or
+    once its JS heap passes `max_heap_mb`, which keeps browser memory flat on
+    long runs. A new shared context starts with an empty cache: `fresh` is
+    True for its first lease, so that sample can be reported as cold.
+    Playwright sync objects are per-thread: use one pool per worker.
+    """
+
+    def __init__(self, browser, mode="warm", spares=2, max_uses=0,
+                 max_heap_mb=0, setup=None, **ctx_opts):
+        if mode not in MODES:
+            raise ValueError(f"unknown context mode: {mode}")
+
+        self.browser = browser
+        self.mode = mode
+        self.spares_wanted = spares if mode != "warm" else 0
+        self.max_uses = max_uses
+        self.max_heap_mb = max_heap_mb
+        self.setup = setup
+        self.ctx_opts = ctx_opts
+
+        self.spares = deque()
+        self.shared = None
+        self.uses = 0
+        self.fresh = False
+        self.over_heap = False
+        self.recycled = 0
+        self._refill()
+
+    def _new(self):
+        ctx = self.browser.new_context(**self.ctx_opts)
+        if self.setup:
+            self.setup(ctx)
+        return ctx
+
+    def _refill(self):
+        while len(self.spares) < self.spares_wanted:
+            self.spares.append(self._new())
+
+    def _recycle(self):
+        self.shared.close()
+        self.shared = None
+        self.uses = 0
+        self.over_heap = False
+        self.recycled += 1
+
+    def acquire(self):
+        if self.mode == "warm":
+            self.fresh = self.shared is None
+            if self.fresh:
+                self.shared = self._new()
+            self.uses += 1
+            return self.shared
+        return self.spares.popleft() if self.spares else self._new()
+
+    def release(self, ctx):
+        if self.mode != "warm":
+            ctx.close()
+            self._refill()
+        elif self.over_heap or (self.max_uses and self.uses >= self.max_uses):
+            self._recycle()
+
+    @contextmanager
+    def lease(self):
+        ctx = self.acquire()
+        try:
+            yield ctx
+        finally:
+            self.release(ctx)
+
+    def check_heap(self, page):
+        """Mark the shared context for recycling if `page` shows its heap over the limit."""
+        if not self.max_heap_mb or self.mode != "warm" or self.shared is None:
+            return
+        try:
+            cdp = self.shared.new_cdp_session(page)
+            cdp.send("Performance.enable")
+            metrics = {m["name"]: m["value"] for m in cdp.send("Performance.getMetrics")["metrics"]}
+            cdp.detach()
+        except Exception:
+            return
+        if metrics.get("JSHeapTotalSize", 0) / 1024 / 1024 > self.max_heap_mb:
+            self.over_heap = True
+
+    def close(self):
+        for ctx in self.spares:
+            ctx.close()
+        self.spares.clear()
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
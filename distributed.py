@@ -0,0 +1,272 @@
+import os
+import time
+import queue
+import socket
+import threading
+from multiprocessing.connection import Listener, Client
+
+
+# ================= COORDINATOR / AGENTS =================
+#
+# One coordinator owns the target list and the Recorder; agents run the
+# browsers. Agents connect over multiprocessing.connection (HMAC-checked with
+# $PROBE_AUTHKEY), get a shard of the targets, and stream every sample back,
+# so the coordinator's summary, bucket, Prometheus and history output is the
+# same as for a single process. Agents also forward their host telemetry
+# readings, so the bucket report's host_* columns describe the machines
+# running browsers. Shards are recomputed whenever an agent joins, leaves
+# or goes silent. On one box:
+#
+#   export PROBE_AUTHKEY=secret
+#   python synthetic_monitor.py --role coordinator --listen 127.0.0.1:7070 ...
+#   python synthetic_monitor.py --role agent --coordinator 127.0.0.1:7070 --workers 2
+#   python synthetic_monitor.py --role agent --coordinator 127.0.0.1:7070 --workers 2
+#
+# Messages are (kind, payload) tuples:
+#   agent -> coordinator: hello {name, workers}, sample {...}, host {...}, beat, bye
+#   coordinator -> agent: assign {targets, mode, run_id, remaining, options}, rate (target, rate), stop
+#
+# `options` are the coordinator's probe settings (see PROBE_OPTIONS in
+# synthetic_monitor.py); agents apply them over their own command line.
+
+AUTHKEY_ENV = "PROBE_AUTHKEY"
+HEARTBEAT = 10          # seconds between agent beats
+AGENT_TIMEOUT = 35      # silent agents are dropped after this
+
+
+def authkey():
+    key = os.environ.get(AUTHKEY_ENV)
+    if not key:
+        raise SystemExit(f"${AUTHKEY_ENV} must be set to the same secret on coordinator and agents")
+    return key.encode()
+
+
+def parse_addr(addr):
+    host, _, port = addr.rpartition(":")
+    return host or "0.0.0.0", int(port)
+
+
+def shard(targets, names):
+    """Round-robin targets over agents (sorted by name, so shards are stable)."""
+    names = sorted(names)
+    return {n: targets[i::len(names)] for i, n in enumerate(names)}
+
+
+class Agent:
+    def __init__(self, name, conn, workers):
+        self.name, self.conn, self.workers = name, conn, workers
+        self.targets = None
+        self.seen = time.time()
+        self.send_lock = threading.Lock()
+
+    def send(self, kind, payload=None):
+        with self.send_lock:
+            self.conn.send((kind, payload))
+
+
+class Coordinator:
+    def __init__(self, addr, targets, recorder, run_id, mode, end, options=None):
+        self.targets = list(targets)
+        self.recorder = recorder
+        self.run_id, self.mode, self.end = run_id, mode, end
+        self.options = options or {}
+
+        self.agents = {}
+        self.lock = threading.Lock()
+        self.listener = Listener(parse_addr(addr), authkey=authkey())
+        self.samples = 0
+        self.samples_lock = threading.Lock()
+
+    # ---------- membership ----------
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError):
+                return
+            except Exception as e:
+                # bad authkey or a stray connection
+                print(f"[coordinator] rejected connection: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            kind, hello = conn.recv()
+        except (EOFError, OSError):
+            return
+        if kind != "hello":
+            conn.close()
+            return
+
+        agent = Agent(hello["name"], conn, hello.get("workers", 1))
+        with self.lock:
+            old = self.agents.pop(agent.name, None)
+            self.agents[agent.name] = agent
+        if old:
+            old.conn.close()
+        print(f"[coordinator] agent {agent.name} joined ({len(self.agents)} connected)")
+        self._rebalance()
+
+        try:
+            while True:
+                kind, payload = conn.recv()
+                agent.seen = time.time()
+                if kind == "sample":
+                    with self.samples_lock:
+                        self.samples += 1
+                    self.recorder.record(payload)
+                elif kind == "host":
+                    self.recorder.record_host(payload)
+                elif kind == "bye":
+                    break
+        except (EOFError, OSError):
+            pass
+        self._drop(agent, "left")
+
+    def _drop(self, agent, why):
+        with self.lock:
+            if self.agents.get(agent.name) is not agent:
+                return
+            del self.agents[agent.name]
+        try:
+            agent.conn.close()
+        except OSError:
+            pass
+        print(f"[coordinator] agent {agent.name} {why} ({len(self.agents)} connected)")
+        self._rebalance()
+
+    def _rebalance(self):
+        with self.lock:
+            agents = dict(self.agents)
+        shards = shard(self.targets, agents) if agents else {}
+        remaining = max(self.end - time.time(), 0)
+
+        for name, agent in agents.items():
+            mine = shards[name]
+            if mine == agent.targets:
+                continue
+            agent.targets = mine
+            try:
+                agent.send("assign", {
+                    "targets": mine, "mode": self.mode,
+                    "run_id": self.run_id, "remaining": remaining,
+                    "options": self.options,
+                })
+            except OSError:
+                pass
+
+    def rate(self, target, rate):
+        """SloMonitor on_rate hook: forward to whichever agent samples `target`."""
+        with self.lock:
+            owners = [a for a in self.agents.values() if any(t[0] == target for t in a.targets or ())]
+        for a in owners:
+            try:
+                a.send("rate", (target, rate))
+            except OSError:
+                pass
+
+    # ---------- run ----------
+
+    def run(self, drain=30):
+        threading.Thread(target=self._accept_loop, name="coordinator-accept", daemon=True).start()
+        print(f"[coordinator] {len(self.targets)} targets, waiting for agents on "
+              f"{self.listener.address[0]}:{self.listener.address[1]}")
+
+        try:
+            while time.time() < self.end:
+                time.sleep(1)
+                now = time.time()
+                for agent in list(self.agents.values()):
+                    if now - agent.seen > AGENT_TIMEOUT:
+                        self._drop(agent, "timed out")
+        except KeyboardInterrupt:
+            pass
+
+        # let agents finish in-flight samples and say bye
+        with self.lock:
+            agents = list(self.agents.values())
+        for a in agents:
+            try:
+                a.send("stop")
+            except OSError:
+                pass
+        deadline = time.time() + drain
+        while self.agents and time.time() < deadline:
+            time.sleep(0.5)
+
+        self.listener.close()
+        print(f"[coordinator] {self.samples} samples from agents")
+
+
+# ================= AGENT SIDE =================
+
+class AgentLink:
+    """
+    The agent's connection. Stands in for the Recorder on the agent (workers
+    call record()), sends beats, and hands coordinator messages to the
+    on_assign / on_rate / on_stop callbacks.
+    """
+
+    def __init__(self, addr, workers, name=None):
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.conn = Client(parse_addr(addr), authkey=authkey())
+        self.conn.send(("hello", {"name": self.name, "workers": workers}))
+
+        self.on_assign = self.on_rate = self.on_stop = None
+        self.q = queue.Queue()
+        self.closed = threading.Event()
+
+    def wait_assignment(self):
+        kind, payload = self.conn.recv()
+        if kind == "stop":
+            return None
+        assert kind == "assign", kind
+        return payload
+
+    def start(self):
+        threading.Thread(target=self._send_loop, name="agent-send", daemon=True).start()
+        threading.Thread(target=self._recv_loop, name="agent-recv", daemon=True).start()
+
+    def record(self, s):
+        self.q.put(("sample", s))
+
+    def record_host(self, r):
+        """HostMonitor on_reading hook."""
+        self.q.put(("host", r | {"agent": self.name}))
+
+    def _send_loop(self):
+        while True:
+            try:
+                msg = self.q.get(timeout=HEARTBEAT)
+            except queue.Empty:
+                msg = ("beat", None)
+            try:
+                self.conn.send(msg)
+            except (OSError, ValueError):
+                break
+            if msg[0] == "bye":
+                break
+        self.closed.set()
+
+    def _recv_loop(self):
+        try:
+            while True:
+                kind, payload = self.conn.recv()
+                if kind == "assign" and self.on_assign:
+                    self.on_assign(payload)
+                elif kind == "rate" and self.on_rate:
+                    self.on_rate(*payload)
+                elif kind == "stop":
+                    break
+        except (EOFError, OSError):
+            pass
+        # stopped, or the coordinator went away
+        if self.on_stop:
+            self.on_stop()
+
+    def close(self):
+        self.q.put(("bye", None))
+        self.closed.wait(10)
+        self.conn.close()
@@ -0,0 +1,199 @@
+import os
+import time
+import queue
+import threading
+
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+
+# ================= TAXONOMY =================
+
+# Chromium net error -> error_type; first match wins
+NET_ERRORS = [
+    ("ERR_NAME_NOT_RESOLVED", "DNS"),
+    ("ERR_NAME_RESOLUTION_FAILED", "DNS"),
+    ("ERR_CERT_", "TLS"),
+    ("ERR_SSL_", "TLS"),
+    ("ERR_BAD_SSL_CLIENT_AUTH_CERT", "TLS"),
+    ("ERR_CONNECTION_REFUSED", "CONNECT"),
+    ("ERR_CONNECTION_RESET", "CONNECT"),
+    ("ERR_CONNECTION_CLOSED", "CONNECT"),
+    ("ERR_CONNECTION_TIMED_OUT", "CONNECT"),
+    ("ERR_ADDRESS_UNREACHABLE", "CONNECT"),
+    ("ERR_INTERNET_DISCONNECTED", "CONNECT"),
+    ("ERR_ABORTED", "ABORTED"),
+    ("frame was detached", "ABORTED"),
+    ("interrupted by another navigation", "ABORTED"),
+    ("Target page, context or browser has been closed", "ABORTED"),
+]
+
+
+class HttpError(Exception):
+    """Raised by a probe when the main document came back with status >= 400."""
+
+    def __init__(self, status, url):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+
+
+class JsError(Exception):
+    """Uncaught exceptions the page threw while it was being measured."""
+
+
+def classify(e):
+    """(error_type, message) for an exception raised while probing."""
+    msg = str(e)
+    if isinstance(e, HttpError):
+        return f"HTTP_{e.status}", msg
+    if isinstance(e, JsError):
+        return "JS_ERROR", msg
+    for needle, kind in NET_ERRORS:
+        if needle in msg:
+            return kind, msg
+    if isinstance(e, PlaywrightTimeoutError):
+        return "TIMEOUT", msg
+    if "Evaluation failed" in msg or "ReferenceError" in msg or "TypeError" in msg:
+        return "JS_ERROR", msg
+    return "ERROR", msg
+
+
+# ================= CIRCUIT BREAKERS =================
+
+class Breaker:
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.cooldown = 0.0
+        self.probing = False
+
+
+class CircuitBreakers:
+    """
+    Per-target breakers shared by all workers. After `threshold` failures in
+    a row a target's breaker opens: its visits fail fast without a browser
+    until `cooldown` has passed. Then one visit is let through (half-open);
+    success closes the breaker, failure reopens it with the cooldown doubled,
+    up to `max_cooldown`.
+    """
+
+    def __init__(self, threshold=3, cooldown=60, max_cooldown=600):
+        self.threshold = threshold
+        self.base_cooldown, self.max_cooldown = cooldown, max_cooldown
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def allow(self, target):
+        """None to go ahead, or the reason this visit should fail fast."""
+        with self.lock:
+            b = self.breakers.get(target)
+            if b is None or b.failures < self.threshold:
+                return None
+            now = time.time()
+            if now < b.open_until or b.probing:
+                left = max(b.open_until - now, 0)
+                return f"circuit open after {b.failures} failures; next try in {left:.0f}s"
+            b.probing = True
+            return None
+
+    def record(self, target, ok):
+        with self.lock:
+            b = self.breakers.setdefault(target, Breaker())
+            b.probing = False
+            if ok:
+                if b.failures >= self.threshold:
+                    print(f"[breaker] {target} closed")
+                b.failures, b.cooldown = 0, 0.0
+                return
+            b.failures += 1
+            if b.failures >= self.threshold:
+                b.cooldown = min(b.cooldown * 2 or self.base_cooldown, self.max_cooldown)
+                b.open_until = time.time() + b.cooldown
+                if b.failures == self.threshold or b.cooldown > self.base_cooldown:
+                    print(f"[breaker] {target} open for {b.cooldown:.0f}s")
+
+
+# ================= SCREENSHOTS =================
+
+class ScreenshotWriter:
+    """
+    Failure screenshots with a bounded cost: viewport-only JPEG, at most
+    `per_minute` per run and one per target per `per_target_secs`, and
+    re-taken at lower quality (or skipped) when over `max_kb`. The capture
+    has to happen on the probe thread, but the file write is queued to a
+    background thread.
+    """
+
+    def __init__(self, directory, per_minute=10, per_target_secs=300, max_kb=300, quality=60):
+        self.directory = directory
+        self.per_minute = per_minute
+        self.per_target_secs = per_target_secs
+        self.max_bytes = max_kb * 1024
+        self.quality = quality
+
+        self.lock = threading.Lock()
+        self.taken = []                # times of the last minute's shots
+        self.last_by_target = {}
+        self.skipped = 0              # left out by the caps
+        self.failed = 0               # screenshot() raised
+
+        self.q = queue.Queue(maxsize=100)
+        self.thread = threading.Thread(target=self._write_loop, name="screenshot-writer", daemon=True)
+        self.thread.start()
+
+    def _allowed(self, target):
+        now = time.time()
+        with self.lock:
+            self.taken = [t for t in self.taken if now - t < 60]
+            if len(self.taken) >= self.per_minute:
+                return False
+            if now - self.last_by_target.get(target, 0) < self.per_target_secs:
+                return False
+            self.taken.append(now)
+            self.last_by_target[target] = now
+            return True
+
+    def _count(self, attr):
+        with self.lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+        return ""
+
+    def capture(self, page, name, target=None):
+        """Path the shot will be written to, or "" when capped or failed."""
+        if not self._allowed(target or name):
+            return self._count("skipped")
+        try:
+            data = page.screenshot(type="jpeg", quality=self.quality, full_page=False, timeout=5000)
+            if len(data) > self.max_bytes:
+                data = page.screenshot(type="jpeg", quality=30, full_page=False, timeout=5000)
+        except Exception:
+            # a crashed or wedged page; the sample still records the failure
+            return self._count("failed")
+        if len(data) > self.max_bytes:
+            return self._count("skipped")
+
+        path = os.path.join(self.directory, f"{name}.jpg")
+        try:
+            self.q.put_nowait((path, data))
+        except queue.Full:
+            return self._count("skipped")
+        return path
+
+    def _write_loop(self):
+        while True:
+            item = self.q.get()
+            if item is None:
+                return
+            path, data = item
+            try:
+                with open(path, "wb") as f:
+                    f.write(data)
+            except OSError as e:
+                print(f"[screenshots] {path}: {e}")
+
+    def close(self):
+        self.q.put(None)
+        self.thread.join()
+        if self.skipped:
+            print(f"[screenshots] {self.skipped} failure screenshots skipped by the rate/size caps")
+        if self.failed:
+            print(f"[screenshots] {self.failed} failure screenshots could not be taken")
@@ -0,0 +1,245 @@
+import csv
+import sys
+import json
+import math
+import sqlite3
+import argparse
+from datetime import datetime
+from collections import defaultdict
+
+from sketch import QuantileSketch
+
+
+DEFAULT_DB = "runs/history.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id       TEXT PRIMARY KEY,
+    env          TEXT NOT NULL,
+    started_utc  TEXT NOT NULL,
+    finished_utc TEXT NOT NULL,
+    samples      INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_env_started ON runs (env, started_utc);
+
+CREATE TABLE IF NOT EXISTS run_metrics (
+    run_id  TEXT NOT NULL REFERENCES runs (run_id),
+    url     TEXT NOT NULL,
+    cache   TEXT NOT NULL,
+    metric  TEXT NOT NULL,
+    count   INTEGER NOT NULL,
+    sketch  TEXT NOT NULL,
+    PRIMARY KEY (run_id, url, cache, metric)
+);
+"""
+
+
+# ================= INDEX =================
+
+def connect(db):
+    conn = sqlite3.connect(db)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def add_run(db, run_id, env, started, overall):
+    """
+    Store one finished run. `overall` is Recorder.overall:
+    (url, cache) -> metric -> QuantileSketch.
+    """
+    conn = connect(db)
+    with conn:
+        samples = sum(m["duration"].count for m in overall.values() if "duration" in m)
+        conn.execute(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)",
+            (run_id, env, started.isoformat(), datetime.utcnow().isoformat(), samples)
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO run_metrics VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (run_id, url, cache, metric, sk.count, json.dumps(sk.to_dict()))
+                for (url, cache), metrics in overall.items()
+                for metric, sk in metrics.items()
+                if sk.count
+            ]
+        )
+    conn.close()
+
+
+def load_run(conn, run_id, metrics):
+    marks = ",".join("?" * len(metrics))
+    rows = conn.execute(
+        f"SELECT url, cache, metric, sketch FROM run_metrics WHERE run_id = ? AND metric IN ({marks})",
+        (run_id, *metrics)
+    )
+    return {
+        (url, cache, metric): QuantileSketch.from_dict(json.loads(sk))
+        for url, cache, metric, sk in rows
+    }
+
+
+def resolve(conn, ref, env):
+    """A run id, or `latest` / `previous` for the newest runs of `env`."""
+    if ref not in ("latest", "previous"):
+        return ref
+    rows = conn.execute(
+        "SELECT run_id FROM runs WHERE env = ? ORDER BY started_utc DESC LIMIT 2", (env,)
+    ).fetchall()
+    i = 0 if ref == "latest" else 1
+    if len(rows) <= i:
+        raise SystemExit(f"no {ref} run for env {env}")
+    return rows[i][0]
+
+
+# ================= STATS =================
+
+def mann_whitney(a, b):
+    """
+    One-sided Mann-Whitney U on two sketches (is `b` stochastically larger?).
+    Values in the same sketch bucket count as ties. Returns (z, p).
+    """
+    na, nb = a.count, b.count
+    if not na or not nb:
+        return 0.0, 1.0
+
+    levels = defaultdict(lambda: [0, 0])
+    levels[None] = [a.zeros, b.zeros]
+    for k, n in a.bins.items():
+        levels[k][0] += n
+    for k, n in b.bins.items():
+        levels[k][1] += n
+
+    u = 0.0
+    below_a = 0
+    ties = 0.0
+    for k in sorted(levels, key=lambda k: -math.inf if k is None else k):
+        ca, cb = levels[k]
+        u += cb * (below_a + ca / 2)
+        below_a += ca
+        t = ca + cb
+        ties += t ** 3 - t
+
+    n = na + nb
+    var = na * nb / 12 * ((n + 1) - ties / (n * (n - 1))) if n > 1 else 0
+    if var <= 0:
+        return 0.0, 1.0
+
+    z = (u - na * nb / 2) / math.sqrt(var)
+    return z, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+# ================= COMMANDS =================
+
+def compare(args):
+    conn = connect(args.db)
+    base_id = resolve(conn, args.baseline, args.env)
+    cand_id = resolve(conn, args.candidate, args.env)
+
+    metrics = [m.strip() for m in args.metrics.split(",")]
+    pcts = [int(p) for p in args.percentiles.split(",")]
+    base = load_run(conn, base_id, metrics)
+    cand = load_run(conn, cand_id, metrics)
+    conn.close()
+
+    rows = []
+    regressions = 0
+    for key in sorted(base.keys() & cand.keys()):
+        a, b = base[key], cand[key]
+        if a.count < args.min_samples or b.count < args.min_samples:
+            continue
+
+        z, p = mann_whitney(a, b)
+        for pct in pcts:
+            qa, qb = a.quantile(pct), b.quantile(pct)
+            change = (qb - qa) / qa if qa > 0 else 0.0
+            regressed = p < args.alpha and change > args.threshold
+            regressions += regressed
+            rows.append([
+                *key, f"p{pct}", round(qa, 1), round(qb, 1), f"{change:+.1%}",
+                a.count, b.count, round(p, 4), "REGRESSION" if regressed else ""
+            ])
+
+    header = ["url", "cache", "metric", "stat", "baseline", "candidate",
+              "change", "n_base", "n_cand", "p_value", "verdict"]
+
+    out = open(args.out, "w", newline="") if args.out else sys.stdout
+    w = csv.writer(out)
+    w.writerow(header)
+    w.writerows(rows)
+    if args.out:
+        out.close()
+
+    print(f"\nbaseline {base_id} vs candidate {cand_id}: "
+          f"{regressions} regressions (p < {args.alpha}, change > {args.threshold:.0%})",
+          file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def list_runs(args):
+    conn = connect(args.db)
+    rows = conn.execute(
+        "SELECT run_id, env, started_utc, samples FROM runs "
+        "WHERE env = ? ORDER BY started_utc DESC LIMIT ?", (args.env, args.limit)
+    )
+    for r in rows:
+        print(*r, sep="\t")
+    conn.close()
+    return 0
+
+
+def add_from_results(args):
+    """Backfill the index from a results.csv written before the index existed."""
+    overall = defaultdict(lambda: defaultdict(QuantileSketch))
+    env = run_id = started = None
+
+    with open(args.results, newline="") as f:
+        for r in csv.DictReader(f):
+            env, run_id = env or r["env"], run_id or r["run_id"]
+            started = started or datetime.fromisoformat(r["timestamp_utc"])
+            if r["status"] != "SUCCESS" or int(r["duration_ms"]) <= 0:
+                continue
+            key = (r["url"], r.get("cache") or "warm")
+            overall[key]["duration"].add(int(r["duration_ms"]))
+            if int(r["lcp_ms"]) > 0:
+                overall[key]["lcp"].add(int(r["lcp_ms"]))
+
+    if run_id is None:
+        raise SystemExit("results file is empty")
+    add_run(args.db, run_id, env, started, overall)
+    print(f"indexed {run_id}")
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("Cross-run history for synthetic_monitor.py")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    c = sub.add_parser("compare", help="diff a candidate run against a baseline; exit 1 on regression")
+    c.add_argument("--baseline", default="previous", help="run id, 'latest' or 'previous'")
+    c.add_argument("--candidate", default="latest", help="run id, 'latest' or 'previous'")
+    c.add_argument("--env", default="staging")
+    c.add_argument("--metrics", default="duration,lcp")
+    c.add_argument("--percentiles", default="90,95")
+    c.add_argument("--alpha", type=float, default=0.05, help="significance level")
+    c.add_argument("--threshold", type=float, default=0.10,
+                   help="minimum relative increase that counts as a regression")
+    c.add_argument("--min-samples", type=int, default=10)
+    c.add_argument("--out", help="write the comparison CSV here instead of stdout")
+    c.set_defaults(func=compare)
+
+    l = sub.add_parser("list", help="recent runs of an env")
+    l.add_argument("--env", default="staging")
+    l.add_argument("--limit", type=int, default=20)
+    l.set_defaults(func=list_runs)
+
+    a = sub.add_parser("add", help="index an existing results.csv")
+    a.add_argument("results")
+    a.set_defaults(func=add_from_results)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(args.func(args))
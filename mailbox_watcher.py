@@ -0,0 +1,244 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+DEFAULT_BASE_URL = os.environ.get("MAILSAC_BASE_URL", "https://mailsac.com")
+BODY_CACHE = 500        # message bodies kept for other waiters on the same inbox
+
+
+class MailTimeout(RuntimeError):
+    pass
+
+
+class Waiter:
+    def __init__(self, match_fn, deadline, ignore=None):
+        self.match_fn = match_fn
+        self.deadline = deadline
+        self.future = Future()
+        # message ids already offered to match_fn; None until the first poll
+        self.checked = None if ignore is None else set(ignore)
+
+
+class Inbox:
+    def __init__(self, poll_min):
+        self.waiters = []
+        self.interval = poll_min
+        self.due = 0.0
+
+
+class MailboxWatcher:
+    """
+    Polls Mailsac (or anything serving the same two endpoints) for every
+    inbox that has a pending wait, from one background thread over one
+    pooled HTTP session.
+
+    watch() returns a Future resolved with the first matching message body.
+    Bodies are downloaded once per message id and cached, so several waiters
+    on one inbox and repeated polls never refetch them. An inbox that shows
+    nothing new is polled less often (up to `poll_max`); a new message or a
+    new waiter resets it to `poll_min`. A 429 pauses all polling for the
+    server's Retry-After.
+    """
+
+    def __init__(self, headers, base_url=DEFAULT_BASE_URL, poll_min=2, poll_max=20,
+                 backoff=1.5, max_rps=5, timeout=20, session=None):
+        self.base_url = base_url.rstrip("/")
+        self.poll_min, self.poll_max, self.backoff = poll_min, poll_max, backoff
+        self.min_gap = 1 / max_rps if max_rps else 0
+        self.timeout = timeout
+
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+            session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+        session.headers.update(headers)
+        self.session = session
+
+        self.inboxes = {}
+        self.bodies = OrderedDict()    # message id -> text, least recently used first
+        self.requests = 0
+        self.paused_until = 0.0
+        self.last_request = 0.0
+
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # ---------- public ----------
+
+    def watch(self, email, match_fn, timeout, ignore=None):
+        """
+        Future for the first message in `email` where match_fn(msg, body) is truthy.
+        By default the inbox's newest message at the first poll is a candidate;
+        pass `ignore` (ids from message_ids()) to only accept messages not in it.
+        """
+        waiter = Waiter(match_fn, time.time() + timeout, ignore)
+        with self.lock:
+            inbox = self.inboxes.setdefault(email, Inbox(self.poll_min))
+            inbox.waiters.append(waiter)
+            inbox.interval = self.poll_min
+            inbox.due = 0.0
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="mailbox-watcher", daemon=True)
+                self.thread.start()
+        self.wake.set()
+        return waiter.future
+
+    def wait(self, email, match_fn, timeout, ignore=None):
+        return self.watch(email, match_fn, timeout, ignore).result()
+
+    def message_ids(self, email):
+        """Ids of the messages in `email` right now."""
+        return {m["_id"] for m in self.list_messages(email) if isinstance(m, dict) and "_id" in m}
+
+    def close(self):
+        self.stop_event.set()
+        self.wake.set()
+        if self.thread:
+            self.thread.join()
+        with self.lock:
+            for inbox in self.inboxes.values():
+                for w in inbox.waiters:
+                    w.future.cancel()
+            self.inboxes.clear()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- HTTP ----------
+
+    def _get(self, path):
+        gap = self.last_request + self.min_gap - time.time()
+        if gap > 0:
+            time.sleep(gap)
+        self.last_request = time.time()
+        self.requests += 1
+
+        r = self.session.get(f"{self.base_url}{path}", timeout=self.timeout)
+        if r.status_code == 429:
+            retry = float(r.headers.get("Retry-After") or self.poll_max)
+            self.paused_until = time.time() + retry
+        r.raise_for_status()
+        return r
+
+    def list_messages(self, email):
+        return self._get(f"/api/addresses/{email}/messages").json()
+
+    def message_text(self, email, message_id):
+        if message_id in self.bodies:
+            self.bodies.move_to_end(message_id)
+            return self.bodies[message_id]
+        body = self.bodies[message_id] = self._get(f"/api/text/{email}/{message_id}").text
+        if len(self.bodies) > BODY_CACHE:
+            self.bodies.popitem(last=False)
+        return body
+
+    # ---------- polling ----------
+
+    def _run(self):
+        error = None
+        try:
+            self._loop()
+        except Exception as e:
+            error = e
+            print(f"[mailbox] watcher stopped: {e!r}", flush=True)
+        finally:
+            if not self.stop_event.is_set():
+                self._fail_all(RuntimeError(f"mailbox watcher stopped: {error!r}"))
+
+    def _fail_all(self, exc):
+        """Resolve every pending future, so no caller waits on a dead thread."""
+        with self.lock:
+            for inbox in self.inboxes.values():
+                for w in inbox.waiters:
+                    if not w.future.done():
+                        w.future.set_exception(exc)
+            self.inboxes.clear()
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            now = time.time()
+            with self.lock:
+                self._expire(now)
+                due = [(email, inbox) for email, inbox in self.inboxes.items()
+                       if inbox.waiters and inbox.due <= now]
+                next_due = min((i.due for i in self.inboxes.values() if i.waiters), default=None)
+
+            if now < self.paused_until:
+                self.wake.wait(self.paused_until - now)
+                self.wake.clear()
+                continue
+
+            for email, inbox in due:
+                if time.time() < self.paused_until:
+                    break
+                try:
+                    self._poll(email, inbox)
+                except Exception as e:
+                    # transient API errors (and malformed responses) just push
+                    # the next poll out; the thread must survive for the others
+                    if not isinstance(e, requests.RequestException):
+                        print(f"[mailbox] poll of {email} failed: {e!r}", flush=True)
+                    inbox.interval = min(inbox.interval * self.backoff, self.poll_max)
+                inbox.due = time.time() + inbox.interval
+
+            if not due:
+                wait = None if next_due is None else max(next_due - time.time(), 0)
+                self.wake.wait(wait)
+                self.wake.clear()
+
+    def _expire(self, now):
+        for email in list(self.inboxes):
+            inbox = self.inboxes[email]
+            for w in [w for w in inbox.waiters if w.deadline <= now or w.future.done()]:
+                inbox.waiters.remove(w)
+                if not w.future.done():
+                    w.future.set_exception(MailTimeout(f"Timed out waiting for email in {email}"))
+            if not inbox.waiters:
+                del self.inboxes[email]
+
+    def _poll(self, email, inbox):
+        # newest first; entries without an id can't be tracked, so skip them
+        messages = [m for m in self.list_messages(email) if isinstance(m, dict) and "_id" in m]
+        ids = [m["_id"] for m in messages]
+        new = False
+
+        with self.lock:
+            waiters = list(inbox.waiters)
+        for w in waiters:
+            if w.checked is None:
+                # like a single fetch of the latest message: an email that
+                # arrived just before the wait started still counts
+                candidates = messages[:1]
+                w.checked = set(ids[1:])
+            else:
+                candidates = [m for m in messages if m["_id"] not in w.checked]
+                new = new or bool(candidates)
+
+            # an id only counts as checked once match_fn has seen its body; if
+            # the body fetch fails, the message is offered again next poll
+            for msg in candidates:
+                if w.future.done():
+                    break
+                body = self.message_text(email, msg["_id"])
+                try:
+                    if w.match_fn(msg, body):
+                        w.future.set_result(body)
+                except Exception as e:
+                    w.future.set_exception(e)
+                w.checked.add(msg["_id"])
+
+        with self.lock:
+            inbox.waiters = [w for w in inbox.waiters if not w.future.done()]
+        inbox.interval = self.poll_min if new else min(inbox.interval * self.backoff, self.poll_max)
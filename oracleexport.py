@@ -1,6 +1,17 @@
+import io
+import os
+import csv
+import gzip
+import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import oracledb
 import pandas as pd
 
+import watermark
+
 # ---------- CONFIG SECTION ----------
 # Update these values as per your DB
 DB_HOST = "your-db-hostname"       # e.g. "10.10.10.5" or "db.mycompany.com"
@@ -18,8 +29,43 @@ WHERE ROWNUM <= 100
 """
 
 # Output file config
-OUTPUT_FILE = "oracle_query_result.csv"  # change to .xlsx for Excel
+# The extension picks the format: .csv, .csv.gz, .csv.zst, .parquet, .arrow or .xlsx
+OUTPUT_FILE = "oracle_query_result.csv"
 WRITE_EXCEL = False  # set to True to write Excel instead of CSV
+
+PARQUET_COMPRESSION = "zstd"        # "zstd", "snappy", "gzip" or "none"
+PARQUET_ROW_GROUP_ROWS = 250_000    # rows per Parquet row group / Arrow record batch
+CSV_COMPRESSION_LEVEL = 6           # for .csv.gz / .csv.zst
+
+# Streaming mode: rows go from the cursor to the file batch by batch, so
+# memory stays flat whatever the row count. Set False for the pandas path.
+STREAM_EXPORT = True
+FETCH_BATCH_SIZE = 10000   # cursor.arraysize = rows per fetchmany() roundtrip
+PREFETCH_ROWS = 10000      # rows returned with the execute() roundtrip itself
+PROGRESS_EVERY_SEC = 5
+
+# Parallel mode (PARALLEL_WORKERS > 1): SQL_QUERY is split into partitions
+# that run at the same time over an oracledb connection pool. Any format
+# but .xlsx; only plain .csv parts can be merged back into one file.
+#   "hash"  - ORA_HASH(PARTITION_KEY) buckets; any key type, even spread
+#   "range" - MIN..MAX of a numeric PARTITION_KEY cut into equal ranges
+#   "rowid" - ROWID ranges over PARTITION_TABLE's extents; SQL_QUERY must
+#             contain {rowid_range}, e.g. "SELECT * FROM your_table WHERE {rowid_range}"
+PARALLEL_WORKERS = 1
+PARTITION_METHOD = "hash"
+PARTITION_KEY = "ID"
+PARTITION_TABLE = "YOUR_TABLE"
+PARTITIONS = None          # default: one per worker
+MERGE_PARTITIONS = True    # False keeps <output>.partNN.csv files
+
+# Incremental mode: each run appends only rows past the high-water mark kept
+# in STATE_FILE, checkpointing after every fetch batch so an interrupted
+# run resumes where it stopped. CSV outputs only (.csv, .csv.gz, .csv.zst).
+# The mark column should be indexed; rows are read in mark order.
+INCREMENTAL = False
+WATERMARK_COLUMN = "UPDATED_AT"   # timestamp or increasing key in SQL_QUERY's select list
+WATERMARK_TIEBREAK = "ID"         # unique column for rows sharing a mark; None if the mark is unique
+STATE_FILE = None                 # default: <OUTPUT_FILE>.state.json
 # ------------------------------------
 
 
@@ -62,5 +108,418 @@ def run_query_to_file():
             conn.close()
 
 
+class Progress:
+    def __init__(self):
+        self.start = self.last = time.time()
+        self.rows = 0
+        self.lock = threading.Lock()
+
+    def add(self, n, final=False):
+        with self.lock:
+            self.rows += n
+            now = time.time()
+            if final or now - self.last >= PROGRESS_EVERY_SEC:
+                self.last = now
+                elapsed = max(now - self.start, 1e-6)
+                print(f"{self.rows:,} rows in {elapsed:,.1f}s ({self.rows / elapsed:,.0f} rows/s)", flush=True)
+
+
+def fetch_batches(cursor, sql, params=None):
+    """Execute now (so cursor.description is set) and return an iterator of row batches."""
+    cursor.arraysize = FETCH_BATCH_SIZE
+    if hasattr(cursor, "prefetchrows"):
+        # oracledb only; other DB-API cursors (e.g. a sqlite3 stand-in) lack it
+        cursor.prefetchrows = PREFETCH_ROWS
+    cursor.execute(sql, params or {})
+    return iter(cursor.fetchmany, [])
+
+
+def open_text_output(output_path):
+    """Plain, gzip or zstd text file depending on the extension."""
+    lower = output_path.lower()
+    if lower.endswith(".gz"):
+        return gzip.open(output_path, "wt", newline="", encoding="utf-8",
+                         compresslevel=CSV_COMPRESSION_LEVEL)
+    if lower.endswith(".zst"):
+        import zstandard
+        raw = open(output_path, "wb")
+        stream = zstandard.ZstdCompressor(level=CSV_COMPRESSION_LEVEL).stream_writer(raw)
+        return io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    return open(output_path, "w", newline="", encoding="utf-8")
+
+
+def write_csv_stream(cursor, batches, output_path, progress):
+    with open_text_output(output_path) as f:
+        writer = csv.writer(f)
+        writer.writerow([col[0] for col in cursor.description])
+        for rows in batches:
+            writer.writerows(rows)
+            progress.add(len(rows))
+
+
+def write_excel_stream(cursor, batches, output_path, progress):
+    from openpyxl import Workbook
+
+    # write-only workbooks stream rows to disk instead of building a sheet in memory
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([col[0] for col in cursor.description])
+
+    limit = 1048575
+    for rows in batches:
+        if progress.rows + len(rows) > limit:
+            rows = rows[:limit - progress.rows]
+            print(f"Excel row limit reached; output truncated at {limit:,} rows")
+        for row in rows:
+            ws.append(row)
+        progress.add(len(rows))
+        if progress.rows >= limit:
+            break
+
+    wb.save(output_path)
+
+
+# ---------- COLUMNAR OUTPUT ----------
+
+def arrow_schema(description):
+    """
+    pyarrow schema straight from the Oracle column metadata, so no type is
+    guessed from the data. NUMBER(p<=18, 0) becomes int64; other NUMBERs
+    arrive from oracledb as float and stay float64.
+    """
+    import pyarrow as pa
+
+    fields = []
+    for col in description:
+        name, t = col.name, col.type_code
+        if t is oracledb.DB_TYPE_NUMBER:
+            exact_int = col.scale == 0 and col.precision and col.precision <= 18
+            typ = pa.int64() if exact_int else pa.float64()
+        elif t is oracledb.DB_TYPE_BINARY_FLOAT:
+            typ = pa.float32()
+        elif t is oracledb.DB_TYPE_BINARY_DOUBLE:
+            typ = pa.float64()
+        elif t in (oracledb.DB_TYPE_DATE, oracledb.DB_TYPE_TIMESTAMP,
+                   oracledb.DB_TYPE_TIMESTAMP_LTZ, oracledb.DB_TYPE_TIMESTAMP_TZ):
+            typ = pa.timestamp("us")
+        elif t in (oracledb.DB_TYPE_RAW, oracledb.DB_TYPE_LONG_RAW, oracledb.DB_TYPE_BLOB):
+            typ = pa.binary()
+        elif t is oracledb.DB_TYPE_BOOLEAN:
+            typ = pa.bool_()
+        else:
+            typ = pa.string()
+        fields.append(pa.field(name, typ, nullable=bool(col.null_ok)))
+    return pa.schema(fields)
+
+
+def row_groups(batches, size):
+    """Regroup fetch batches into lists of `size` rows."""
+    buf = []
+    for rows in batches:
+        buf.extend(rows)
+        while len(buf) >= size:
+            yield buf[:size]
+            buf = buf[size:]
+    if buf:
+        yield buf
+
+
+def to_record_batch(rows, schema):
+    import pyarrow as pa
+
+    columns = list(zip(*rows))
+    arrays = []
+    for values, field in zip(columns, schema):
+        if pa.types.is_string(field.type):
+            values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+        elif pa.types.is_binary(field.type):
+            values = [v.read() if hasattr(v, "read") else v for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet_stream(cursor, batches, output_path, progress):
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(cursor.description)
+    compression = None if PARQUET_COMPRESSION == "none" else PARQUET_COMPRESSION
+    with pq.ParquetWriter(output_path, schema, compression=compression) as writer:
+        for rows in row_groups(batches, PARQUET_ROW_GROUP_ROWS):
+            writer.write_batch(to_record_batch(rows, schema), row_group_size=len(rows))
+            progress.add(len(rows))
+
+
+def write_arrow_stream(cursor, batches, output_path, progress):
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    schema = arrow_schema(cursor.description)
+    with pa.OSFile(output_path, "wb") as sink, ipc.new_file(sink, schema) as writer:
+        for rows in row_groups(batches, PARQUET_ROW_GROUP_ROWS):
+            writer.write_batch(to_record_batch(rows, schema))
+            progress.add(len(rows))
+
+
+def output_target():
+    """(writer, path) for OUTPUT_FILE based on its extension."""
+    lower = OUTPUT_FILE.lower()
+    if WRITE_EXCEL or lower.endswith(".xlsx"):
+        return write_excel_stream, OUTPUT_FILE if lower.endswith(".xlsx") else "oracle_query_result.xlsx"
+    if lower.endswith(".parquet"):
+        return write_parquet_stream, OUTPUT_FILE
+    if lower.endswith((".arrow", ".feather")):
+        return write_arrow_stream, OUTPUT_FILE
+    if lower.endswith((".csv", ".csv.gz", ".csv.zst")):
+        return write_csv_stream, OUTPUT_FILE
+    return write_csv_stream, "oracle_query_result.csv"
+
+
+def stream_query_to_file():
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        progress = Progress()
+        batches = fetch_batches(cursor, SQL_QUERY)
+
+        write, output_path = output_target()
+        write(cursor, batches, output_path, progress)
+
+        progress.add(0, final=True)
+        print(f"Data written to file: {output_path}")
+        cursor.close()
+
+    except oracledb.DatabaseError as e:
+        error_obj, = e.args
+        print("Oracle-Error-Message:", error_obj.message)
+    finally:
+        if conn:
+            conn.close()
+
+
+# ---------- INCREMENTAL EXPORT ----------
+
+def incremental_query_to_file():
+    write, output_path = output_target()
+    if write is not write_csv_stream:
+        raise SystemExit("incremental export appends to CSV only; use .csv, .csv.gz or .csv.zst")
+    state_path = STATE_FILE or output_path + ".state.json"
+
+    state = watermark.load_state(state_path)
+    watermark.check_state(state, WATERMARK_COLUMN, WATERMARK_TIEBREAK, output_path)
+    if state:
+        print(f"Resuming after {state['mark']} ({state['rows']:,} rows already exported)")
+
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        progress = Progress()
+        timestamp = watermark.mark_is_timestamp(cursor, SQL_QUERY, WATERMARK_COLUMN)
+        sql, params = watermark.incremental_query(SQL_QUERY, WATERMARK_COLUMN, WATERMARK_TIEBREAK,
+                                                  state, timestamp)
+        batches = fetch_batches(cursor, sql, params)
+        idx = watermark.mark_columns(cursor.description, WATERMARK_COLUMN, WATERMARK_TIEBREAK)
+        width = watermark.data_width(cursor.description)
+
+        header = [col[0] for col in cursor.description[:width]]
+        with watermark.CheckpointedCsv(output_path, header, state_path, WATERMARK_COLUMN,
+                                       WATERMARK_TIEBREAK, state, level=CSV_COMPRESSION_LEVEL) as out:
+            for rows in batches:
+                mark = watermark.row_mark(rows[-1], idx)
+                out.write([r[:width] for r in rows] if width < len(rows[0]) else rows, mark)
+                progress.add(len(rows))
+
+        progress.add(0, final=True)
+        print(f"Data appended to file: {output_path} (state: {state_path})")
+        cursor.close()
+
+    except oracledb.DatabaseError as e:
+        error_obj, = e.args
+        print("Oracle-Error-Message:", error_obj.message)
+    finally:
+        if conn:
+            conn.close()
+
+
+# ---------- PARALLEL PARTITIONED EXPORT ----------
+
+ROWID_RANGES_SQL = """
+SELECT MIN(start_rowid), MAX(end_rowid)
+FROM (
+    SELECT DBMS_ROWID.ROWID_CREATE(1, o.data_object_id, e.relative_fno, e.block_id, 0) start_rowid,
+           DBMS_ROWID.ROWID_CREATE(1, o.data_object_id, e.relative_fno, e.block_id + e.blocks - 1, 32767) end_rowid,
+           NTILE(:n) OVER (ORDER BY o.data_object_id, e.relative_fno, e.block_id) grp
+    FROM user_extents e
+    JOIN user_objects o
+      ON o.object_name = e.segment_name
+     AND NVL(o.subobject_name, '-') = NVL(e.partition_name, '-')
+    WHERE e.segment_name = :tab
+      AND o.data_object_id IS NOT NULL
+)
+GROUP BY grp
+ORDER BY grp
+"""
+
+
+def hash_partitions(sql, key, n):
+    """
+    One ORA_HASH bucket per partition. Each partition still runs the whole
+    query and filters it, so the source is scanned n times; prefer "rowid"
+    (or "range" on an indexed key) for big full-table exports.
+    """
+    part_sql = f"SELECT * FROM ({sql}) q WHERE ORA_HASH(q.{key}, {n - 1}) = :part"
+    return [(part_sql, {"part": i}) for i in range(n)]
+
+
+def range_bounds(lo, hi, n):
+    """n contiguous [lo, hi) ranges covering lo..hi; the last one includes hi."""
+    step = (hi - lo) / n
+    edges = [lo + step * i for i in range(n)] + [hi]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def range_partitions(sql, key, n, conn):
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT MIN(q.{key}), MAX(q.{key}) FROM ({sql}) q")
+        lo, hi = cur.fetchone()
+    finally:
+        cur.close()
+    if lo is None:
+        return [(sql, {})]
+
+    parts = []
+    bounds = range_bounds(lo, hi, n)
+    for i, (a, b) in enumerate(bounds):
+        op = "<=" if i == len(bounds) - 1 else "<"
+        parts.append((
+            f"SELECT * FROM ({sql}) q WHERE q.{key} >= :lo AND q.{key} {op} :hi",
+            {"lo": a, "hi": b}
+        ))
+    return parts
+
+
+def rowid_partitions(sql, table, n, conn):
+    if "{rowid_range}" not in sql:
+        raise ValueError("rowid partitioning needs {rowid_range} in SQL_QUERY")
+    part_sql = sql.replace("{rowid_range}", "ROWID BETWEEN CHARTOROWID(:lo) AND CHARTOROWID(:hi)")
+
+    with conn.cursor() as cur:
+        cur.execute(ROWID_RANGES_SQL, {"n": n, "tab": table.upper()})
+        ranges = cur.fetchall()
+    return [(part_sql, {"lo": lo, "hi": hi}) for lo, hi in ranges]
+
+
+def partition_queries(conn, sql=SQL_QUERY, method=PARTITION_METHOD, n=None):
+    n = n or PARTITIONS or PARALLEL_WORKERS
+    if method == "hash":
+        return hash_partitions(sql, PARTITION_KEY, n)
+    if method == "range":
+        return range_partitions(sql, PARTITION_KEY, n, conn)
+    if method == "rowid":
+        return rowid_partitions(sql, PARTITION_TABLE, n, conn)
+    raise ValueError(f"unknown PARTITION_METHOD: {method}")
+
+
+def part_path(output_path, i):
+    stem, ext = os.path.splitext(output_path)
+    if ext.lower() in (".gz", ".zst"):
+        stem, inner = os.path.splitext(stem)
+        ext = inner + ext
+    return f"{stem}.part{i:02d}{ext}"
+
+
+def export_partition(pool, write, i, sql, params, output_path, progress):
+    with pool.acquire() as conn:
+        cursor = conn.cursor()
+        write(cursor, fetch_batches(cursor, sql, params), part_path(output_path, i), progress)
+        cursor.close()
+
+
+def merge_parts(paths, output_path):
+    """Concatenate part files, keeping only the first header."""
+    with open(output_path, "wb") as out:
+        for n, path in enumerate(paths):
+            with open(path, "rb") as f:
+                header = f.readline()
+                if n == 0:
+                    out.write(header)
+                shutil.copyfileobj(f, out, 1024 * 1024)
+            os.remove(path)
+
+
+def parallel_export(pool, parts, output_path, workers=PARALLEL_WORKERS, write=write_csv_stream):
+    """
+    Run each (sql, params) partition on its own pooled connection and write
+    <output>.partNN files, merged into `output_path` if MERGE_PARTITIONS.
+    `pool` only needs acquire() returning a DB-API connection context manager.
+    If any partition fails, the part files (and a half-merged output) are
+    removed and the error is raised.
+    """
+    progress = Progress()
+    paths = [part_path(output_path, i) for i in range(len(parts))]
+    merge = MERGE_PARTITIONS and output_path.lower().endswith(".csv")
+    done = merging = False
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = [
+                ex.submit(export_partition, pool, write, i, sql, params, output_path, progress)
+                for i, (sql, params) in enumerate(parts)
+            ]
+            try:
+                for f in futures:
+                    f.result()
+            except BaseException:
+                for f in futures:
+                    f.cancel()
+                raise
+        progress.add(0, final=True)
+        if merge:
+            merging = True
+            merge_parts(paths, output_path)
+        done = True
+    finally:
+        if not done:
+            for path in paths + ([output_path] if merging else []):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    if merge:
+        print(f"Data written to CSV file: {output_path}")
+    else:
+        print(f"Data written to {len(paths)} partition files: {part_path(output_path, 0)} ...")
+
+
+def parallel_query_to_file():
+    dsn = oracledb.makedsn(DB_HOST, DB_PORT, service_name=DB_SERVICE_NAME)
+    pool = oracledb.create_pool(
+        user=DB_USER, password=DB_PASSWORD, dsn=dsn,
+        min=PARALLEL_WORKERS, max=PARALLEL_WORKERS, increment=0
+    )
+    write, output_path = output_target()
+    if write is write_excel_stream:
+        raise SystemExit("parallel export cannot write .xlsx; use .csv, .parquet or .arrow")
+
+    try:
+        with pool.acquire() as conn:
+            parts = partition_queries(conn)
+        print(f"Exporting {len(parts)} {PARTITION_METHOD} partitions over {PARALLEL_WORKERS} connections...")
+        parallel_export(pool, parts, output_path, write=write)
+
+    except oracledb.DatabaseError as e:
+        error_obj, = e.args
+        print("Oracle-Error-Message:", error_obj.message)
+    finally:
+        pool.close()
+
+
 if __name__ == "__main__":
-    run_query_to_file()
+    if INCREMENTAL:
+        incremental_query_to_file()
+    elif PARALLEL_WORKERS > 1:
+        parallel_query_to_file()
+    elif STREAM_EXPORT:
+        stream_query_to_file()
+    else:
+        run_query_to_file()
@@ -0,0 +1,424 @@
+import os
+import sys
+import math
+import time
+import base64
+import bisect
+import random
+import hashlib
+import argparse
+import functools
+from abc import ABC, abstractmethod
+from array import array
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import psycopg
+from psycopg import sql
+
+# ---------- CONFIG SECTION ----------
+# Any libpq connection string; a local test database by default
+PG_DSN = os.environ.get("PG_DSN", "postgresql://postgres@localhost:5432/postgres")
+
+WORKERS = os.cpu_count() or 4   # generator processes, one COPY connection each
+CHUNK_ROWS = 500_000            # rows per COPY (and per transaction)
+WRITE_ROWS = 10_000             # rows per copy.write() call
+SEED = 42                       # same seed + spec = same rows, whatever the worker count
+
+TRUNCATE = False                # empty the table first
+DROP_INDEXES = True             # drop indexes/PK/unique constraints before, rebuild after
+INDEX_WORKERS = 4               # indexes rebuilt in parallel
+MAINTENANCE_WORK_MEM = "1GB"    # per index build
+# ------------------------------------
+
+
+# ================= GENERATORS =================
+#
+# A generator turns a chunk of row numbers into one column of COPY text
+# values: column(start, n, rng) -> list of n str. Index-derived generators
+# (Seq, Token) give the same value for the same row whatever the chunking,
+# and are unique; the others draw from the chunk's seeded rng.
+
+NULL = "\\N"
+MIN_UNIQUE_TOKEN = 16       # shorter Tokens can collide, so they don't count as unique
+
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def copy_escape(value):
+    """str(value) escaped for COPY text format, so it can't break the row/column framing."""
+    return str(value).translate(COPY_ESCAPES)
+
+
+class Gen(ABC):
+    unique = False
+
+    def __init__(self, null_rate=0.0):
+        self.null_rate = null_rate
+
+    @abstractmethod
+    def values(self, start, n, rng):
+        """n COPY-ready text values for rows start..start+n-1."""
+
+    def column(self, start, n, rng):
+        out = self.values(start, n, rng)
+        if self.null_rate:
+            out = [NULL if rng.random() < self.null_rate else v for v in out]
+        return out
+
+
+class Seq(Gen):
+    """start, start+step, ... by row number."""
+    unique = True
+
+    def __init__(self, start=1, step=1, prefix="", null_rate=0.0):
+        super().__init__(null_rate)
+        self.start, self.step, self.prefix = start, step, copy_escape(prefix)
+
+    def values(self, start, n, rng):
+        first = self.start + start * self.step
+        return [f"{self.prefix}{first + i * self.step}" for i in range(n)]
+
+
+class Token(Gen):
+    """
+    URL-safe string of `length` chars hashed from the row number and `salt`:
+    random-looking like the md5() deeplinks, but reproducible. Only tokens
+    of at least MIN_UNIQUE_TOKEN chars (96 bits) count as unique.
+    """
+
+    def __init__(self, length=32, salt="", null_rate=0.0):
+        super().__init__(null_rate)
+        self.length, self.salt = length, salt.encode()
+        self.unique = length >= MIN_UNIQUE_TOKEN
+        self.blocks = -(-length * 3 // 4 // 64) or 1     # 64-byte digests needed
+
+    def values(self, start, n, rng):
+        out = []
+        for row in range(start, start + n):
+            key = self.salt + row.to_bytes(8, "little")
+            raw = b"".join(
+                hashlib.blake2b(key, digest_size=64, person=b.to_bytes(8, "little")).digest()
+                for b in range(self.blocks)
+            )
+            out.append(base64.urlsafe_b64encode(raw).decode()[:self.length])
+        return out
+
+
+class Choice(Gen):
+    """One of `values`, optionally weighted."""
+
+    def __init__(self, values, weights=None, null_rate=0.0):
+        super().__init__(null_rate)
+        self.options, self.weights = [copy_escape(v) for v in values], weights
+
+    def values(self, start, n, rng):
+        return rng.choices(self.options, weights=self.weights, k=n)
+
+
+class IntRange(Gen):
+    """Uniform integer in [lo, hi]."""
+
+    def __init__(self, lo, hi, null_rate=0.0):
+        super().__init__(null_rate)
+        self.lo, self.hi = lo, hi
+
+    def values(self, start, n, rng):
+        return [str(rng.randint(self.lo, self.hi)) for _ in range(n)]
+
+
+class Zipf(Gen):
+    """
+    One of `cardinality` ids start..start+cardinality-1 with Zipf(s) skew:
+    a few ids take most rows (customers with many invoices), most take few.
+    """
+
+    def __init__(self, cardinality, s=1.1, start=1, prefix="", null_rate=0.0):
+        super().__init__(null_rate)
+        if cardinality < 1:
+            raise ValueError(f"Zipf cardinality must be >= 1, got {cardinality}")
+        self.cardinality, self.s, self.start, self.prefix = cardinality, s, start, copy_escape(prefix)
+        # rank -> id is r * stride mod cardinality, a permutation only for a coprime stride
+        self.stride = 7919
+        while math.gcd(self.stride, cardinality) != 1:
+            self.stride += 1
+
+    def values(self, start, n, rng):
+        cdf = zipf_cdf(self.cardinality, self.s)
+        top = cdf[-1]
+        ids = (bisect.bisect_left(cdf, rng.random() * top) for _ in range(n))
+        # rank r -> a scattered id, so the hot ids aren't all adjacent
+        return [f"{self.prefix}{self.start + (r * self.stride) % self.cardinality}" for r in ids]
+
+
+@functools.lru_cache(maxsize=8)
+def zipf_cdf(cardinality, s):
+    """Cumulative Zipf weights; built once per worker process, not per chunk."""
+    cdf, total = array("d"), 0.0
+    for k in range(1, cardinality + 1):
+        total += k ** -s
+        cdf.append(total)
+    return cdf
+
+
+class Timestamp(Gen):
+    """
+    Between `start` and `end`; skew > 1 crowds values toward `end` (recent
+    rows are the common case), 1 is uniform.
+    """
+
+    def __init__(self, start, end=None, skew=1.0, null_rate=0.0):
+        super().__init__(null_rate)
+        # fixed here, so every worker and chunk agrees on "now"
+        self.start, self.end, self.skew = start, end or datetime.now().replace(microsecond=0), skew
+
+    def values(self, start, n, rng):
+        end = self.end
+        span = (end - self.start).total_seconds()
+        return [
+            (end - timedelta(seconds=span * rng.random() ** self.skew)).isoformat(sep=" ")
+            for _ in range(n)
+        ]
+
+
+class Const(Gen):
+    def __init__(self, value, null_rate=0.0):
+        super().__init__(null_rate)
+        self.value = copy_escape(value)
+
+    def values(self, start, n, rng):
+        return [self.value] * n
+
+
+# ================= TABLE SPECS =================
+#
+# table: "schema.table" or "table"; rows: default row count;
+# columns: name -> generator, in COPY order; unique: columns that must be unique.
+
+SPECS = {
+    # realistic version of the INSERT ... generate_series() in pgsql_datacreation
+    "ebill_delivery_configuration": {
+        "table": "ebill_delivery_configuration",
+        "rows": 50_000_000,
+        "columns": {
+            "invoice_number": Seq(8_000_000_001),
+            "deeplink": Token(101, salt="deeplink"),
+            # customers hold many invoices; use Seq(1_200_000_001) if eid must be unique
+            "eid": Zipf(5_000_000, s=1.05, start=1_200_000_001),
+            "date_created": Timestamp(datetime(2023, 1, 1), skew=2.0),
+        },
+        "unique": ["invoice_number", "deeplink"],
+    },
+}
+
+
+def check_spec(spec):
+    for col in spec.get("unique", []):
+        gen = spec["columns"][col]
+        if not gen.unique:
+            raise ValueError(f"{spec['table']}.{col} must be unique but {type(gen).__name__} can repeat values"
+                             + (f" (Token needs length >= {MIN_UNIQUE_TOKEN})" if isinstance(gen, Token) else ""))
+
+
+def table_ident(name):
+    return sql.Identifier(*name.split("."))
+
+
+# ================= LOAD =================
+
+def chunk_text(spec, start, n, seed):
+    """Rows start..start+n-1 as COPY text lines."""
+    rng = random.Random(f"{seed}:{start}")
+    cols = [g.column(start, n, rng) for g in spec["columns"].values()]
+    return ["\t".join(row) + "\n" for row in zip(*cols)]
+
+
+def load_chunk(dsn, spec, start, n, seed):
+    """COPY one chunk in its own transaction; returns rows written."""
+    copy_sql = sql.SQL("COPY {} ({}) FROM STDIN").format(
+        table_ident(spec["table"]),
+        sql.SQL(", ").join(map(sql.Identifier, spec["columns"])),
+    )
+    with psycopg.connect(dsn) as conn:
+        conn.execute("SET synchronous_commit = off")
+        with conn.cursor() as cur, cur.copy(copy_sql) as copy:
+            for off in range(0, n, WRITE_ROWS):
+                m = min(WRITE_ROWS, n - off)
+                copy.write("".join(chunk_text(spec, start + off, m, seed)))
+    return n
+
+
+def parallel_load(dsn, spec, rows, offset=0, workers=WORKERS, chunk_rows=CHUNK_ROWS, seed=SEED):
+    """Generate and COPY `rows` rows (row numbers from `offset`) over `workers` processes."""
+    chunks = [(s, min(chunk_rows, offset + rows - s)) for s in range(offset, offset + rows, chunk_rows)]
+    t0 = time.time()
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futures = [ex.submit(load_chunk, dsn, spec, s, n, seed) for s, n in chunks]
+        for f in as_completed(futures):
+            done += f.result()
+            elapsed = time.time() - t0
+            print(f"[load] {done:,}/{rows:,} rows, {done / max(elapsed, 1e-6):,.0f} rows/s", flush=True)
+    return done
+
+
+# ================= INDEXES =================
+
+def index_ddl(conn, table):
+    """
+    (drop, create) statements for the table's indexes: constraint-backed
+    ones (PK / unique) as ALTER TABLE ... CONSTRAINT, the rest as indexes.
+    """
+    rows = conn.execute("""
+        SELECT c.conname, pg_get_constraintdef(c.oid), NULL
+        FROM pg_constraint c
+        WHERE c.conrelid = %(t)s::regclass AND c.contype IN ('p', 'u')
+        UNION ALL
+        SELECT i.relname, NULL, pg_get_indexdef(i.oid)
+        FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = %(t)s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+    """, {"t": table}).fetchall()
+
+    t = table_ident(table)
+    drops, creates = [], []
+    for name, condef, idxdef in rows:
+        if condef:
+            drops.append(sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(t, sql.Identifier(name)))
+            creates.append(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} ").format(t, sql.Identifier(name))
+                           + sql.SQL(condef))
+        else:
+            schema = table.split(".")[0] + "." if "." in table else ""
+            drops.append(sql.SQL("DROP INDEX {}").format(table_ident(schema + name)))
+            creates.append(sql.SQL(idxdef))
+    return drops, creates
+
+
+def saved_ddl_path(table):
+    return f"{table}.indexes.sql"
+
+
+def referencing_fks(conn, table):
+    """Foreign keys in other tables that point at `table` (they pin its PK / unique indexes)."""
+    return conn.execute("""
+        SELECT conrelid::regclass::text, conname
+        FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = %(t)s::regclass AND conrelid <> confrelid
+    """, {"t": table}).fetchall()
+
+
+def drop_indexes(dsn, table):
+    """
+    Drop every index on `table` and return the statements that rebuild them.
+    They are written to <table>.indexes.sql first, so an interrupted load
+    can be finished with `--rebuild-only`. All drops run in one transaction:
+    either every index is gone or none is.
+    """
+    with psycopg.connect(dsn) as conn:
+        fks = referencing_fks(conn, table)
+        if fks:
+            names = ", ".join(f"{t}.{c}" for t, c in fks)
+            raise SystemExit(f"{table} is referenced by foreign keys ({names}); "
+                             f"drop them first or load with --keep-indexes")
+
+        drops, creates = index_ddl(conn, table)
+        if not creates:
+            return []
+        path = saved_ddl_path(table)
+        with open(path, "w") as f:
+            for stmt in creates:
+                f.write(stmt.as_string(conn) + ";\n")
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            with conn.transaction():
+                for stmt in drops:
+                    conn.execute(stmt)
+        except Exception:
+            os.remove(path)
+            raise
+    print(f"[indexes] dropped {len(drops)} on {table} (rebuild DDL in {path})")
+    return [line.rstrip(";\n") for line in open(path) if line.strip()]
+
+
+def build_index(dsn, stmt):
+    t0 = time.time()
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        conn.execute(sql.SQL("SET maintenance_work_mem = {}").format(sql.Literal(MAINTENANCE_WORK_MEM)))
+        conn.execute(stmt)
+    return stmt, time.time() - t0
+
+
+def rebuild_indexes(dsn, table, statements=None, workers=INDEX_WORKERS):
+    """Run the saved rebuild DDL, several indexes at a time, then ANALYZE."""
+    path = saved_ddl_path(table)
+    if statements is None:
+        if not os.path.exists(path):
+            print(f"[indexes] nothing saved for {table}")
+            return
+        statements = [line.rstrip(";\n") for line in open(path) if line.strip()]
+
+    # PK / unique constraints go through ALTER TABLE, which locks the table:
+    # run those one by one, the plain indexes in parallel
+    alters = [s for s in statements if s.upper().startswith("ALTER TABLE")]
+    plain = [s for s in statements if s not in alters]
+    for stmt in alters:
+        _, secs = build_index(dsn, stmt)
+        print(f"[indexes] {secs:,.1f}s  {stmt}")
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for f in as_completed([ex.submit(build_index, dsn, s) for s in plain]):
+            stmt, secs = f.result()
+            print(f"[indexes] {secs:,.1f}s  {stmt}")
+
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        conn.execute(sql.SQL("ANALYZE {}").format(table_ident(table)))
+    os.remove(path)
+
+
+# ================= MAIN =================
+
+def main():
+    parser = argparse.ArgumentParser("Bulk synthetic data for Postgres load fixtures")
+    parser.add_argument("--spec", choices=sorted(SPECS), default="ebill_delivery_configuration")
+    parser.add_argument("--dsn", default=PG_DSN)
+    parser.add_argument("--rows", type=int, default=0, help="default: the spec's row count")
+    parser.add_argument("--offset", type=int, default=0,
+                        help="first row number; continue an earlier load without clashing unique values")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--truncate", action="store_true", default=TRUNCATE)
+    parser.add_argument("--keep-indexes", action="store_true", default=not DROP_INDEXES,
+                        help="load with indexes in place (slower, but the table stays queryable)")
+    parser.add_argument("--rebuild-only", action="store_true",
+                        help="only rebuild indexes saved by an interrupted load")
+    args = parser.parse_args()
+
+    spec = SPECS[args.spec]
+    check_spec(spec)
+    table = spec["table"]
+
+    if args.rebuild_only:
+        rebuild_indexes(args.dsn, table)
+        return 0
+
+    if args.truncate:
+        with psycopg.connect(args.dsn, autocommit=True) as conn:
+            conn.execute(sql.SQL("TRUNCATE {}").format(table_ident(table)))
+
+    rows = args.rows or spec["rows"]
+    saved = None if args.keep_indexes else drop_indexes(args.dsn, table)
+
+    t0 = time.time()
+    parallel_load(args.dsn, spec, rows, args.offset, args.workers, args.chunk_rows, args.seed)
+    print(f"[load] {rows:,} rows into {table} in {time.time() - t0:,.1f}s")
+
+    if saved:
+        t1 = time.time()
+        rebuild_indexes(args.dsn, table, saved)
+        print(f"[indexes] rebuilt in {time.time() - t1:,.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
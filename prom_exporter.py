@@ -0,0 +1,125 @@
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sketch import QuantileSketch
+
+
+# metric name, sample key, histogram upper bounds
+HISTOGRAMS = [
+    ("web_page_load_duration_ms", "duration",
+     (100, 250, 500, 1000, 2000, 3000, 5000, 8000, 13000, 20000, 30000, 60000)),
+    ("web_page_fcp_ms", "fcp",
+     (100, 250, 500, 1000, 1800, 3000, 5000, 10000, 20000)),
+    ("web_page_lcp_ms", "lcp",
+     (250, 500, 1000, 1500, 2500, 4000, 6000, 10000, 20000)),
+    ("web_page_cls", "cls",
+     (0.01, 0.05, 0.1, 0.15, 0.25, 0.5, 1.0)),
+]
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def escape(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def labels(**kv):
+    return ",".join(f'{k}="{escape(v)}"' for k, v in kv.items())
+
+
+class ProbeMetrics:
+    """Live Prometheus registry fed by Recorder.record()."""
+
+    def __init__(self, env, run_id):
+        self.env, self.run_id = env, run_id
+        self.lock = threading.Lock()
+
+        # (metric, url, cache) -> [bucket counts..., +Inf], sum
+        self.hist = {}
+        self.sums = defaultdict(float)
+        # (url, cache) -> duration sketch for the summary series
+        self.summary = defaultdict(QuantileSketch)
+        # (url, cache, status, error_type) -> count
+        self.samples = defaultdict(int)
+
+    def observe(self, s):
+        key = (s["url"], s["cache"])
+
+        with self.lock:
+            self.samples[(*key, s["status"], s["error_type"])] += 1
+            if s["status"] != "SUCCESS" or s["duration"] <= 0:
+                return
+
+            self.summary[key].add(s["duration"])
+            for name, metric, bounds in HISTOGRAMS:
+                v = s[metric]
+                if metric != "cls" and v <= 0:
+                    continue
+                counts = self.hist.setdefault((name, *key), [0] * (len(bounds) + 1))
+                for i, le in enumerate(bounds):
+                    if v <= le:
+                        counts[i] += 1
+                counts[-1] += 1
+                self.sums[(name, *key)] += v
+
+    def render(self):
+        out = []
+        with self.lock:
+            for name, _, bounds in HISTOGRAMS:
+                out.append(f"# TYPE {name} histogram")
+                for (n, url, cache), counts in sorted(self.hist.items()):
+                    if n != name:
+                        continue
+                    base = labels(env=self.env, url=url, run_id=self.run_id, cache=cache)
+                    for le, c in zip(bounds, counts):
+                        out.append(f'{name}_bucket{{{base},le="{le}"}} {c}')
+                    out.append(f'{name}_bucket{{{base},le="+Inf"}} {counts[-1]}')
+                    out.append(f"{name}_sum{{{base}}} {self.sums[(name, url, cache)]}")
+                    out.append(f"{name}_count{{{base}}} {counts[-1]}")
+
+            out.append("# TYPE web_page_load_summary_ms summary")
+            for (url, cache), sk in sorted(self.summary.items()):
+                base = labels(env=self.env, url=url, run_id=self.run_id, cache=cache)
+                for q in QUANTILES:
+                    out.append(f'web_page_load_summary_ms{{{base},quantile="{q}"}} {sk.quantile(q * 100):.1f}')
+                out.append(f"web_page_load_summary_ms_sum{{{base}}} {sk.sum}")
+                out.append(f"web_page_load_summary_ms_count{{{base}}} {sk.count}")
+
+            # kept for dashboards built on the old file output
+            out.append("# TYPE web_page_load_p90_ms gauge")
+            for (url, cache), sk in sorted(self.summary.items()):
+                base = labels(env=self.env, url=url, run_id=self.run_id, cache=cache)
+                out.append(f"web_page_load_p90_ms{{{base}}} {int(sk.quantile(90))}")
+
+            out.append("# TYPE web_probe_samples_total counter")
+            for (url, cache, status, err_t), c in sorted(self.samples.items()):
+                base = labels(env=self.env, url=url, run_id=self.run_id, cache=cache,
+                              status=status, error_type=err_t)
+                out.append(f"web_probe_samples_total{{{base}}} {c}")
+
+        return "\n".join(out) + "\n"
+
+
+def serve(metrics, port, addr="0.0.0.0"):
+    """Serve /metrics from a daemon thread; returns the server for shutdown()."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *a):
+            pass
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
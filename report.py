@@ -0,0 +1,147 @@
+import os
+import glob
+import argparse
+
+import pandas as pd
+
+
+# ================= CLI =================
+
+def parse_args():
+    parser = argparse.ArgumentParser("Rebuild reports from raw probe results")
+    parser.add_argument("inputs", nargs="+",
+                        help="results files, globs or run directories "
+                             "(e.g. 'runs/staging/*' or runs/staging/*/results.csv)")
+    parser.add_argument("--bucket", default="5min",
+                        help="pandas frequency for time buckets: 1min, 5min, 1h, 1D ...")
+    parser.add_argument("--percentiles", default="50,90,95,99")
+    parser.add_argument("--metrics", default="duration_ms,lcp_ms",
+                        help="numeric result columns to aggregate")
+    parser.add_argument("--by", default="env,url,cache",
+                        help="group keys; keys missing from the data are skipped")
+    parser.add_argument("--out", default="reports")
+    return parser.parse_args()
+
+
+# ================= LOAD =================
+
+# UI_probe.py / UIProbe_v3.py column names -> synthetic_monitor.py names
+RENAMES = {
+    "page_load_time_ms": "duration_ms",
+}
+
+RESULT_PATTERNS = ("results*.csv", "results*.parquet", "results*.arrow")
+
+
+def expand_inputs(inputs):
+    files = []
+    for item in inputs:
+        for path in sorted(glob.glob(item)) or [item]:
+            if os.path.isdir(path):
+                for pat in RESULT_PATTERNS:
+                    files += sorted(glob.glob(os.path.join(path, pat)))
+            else:
+                files.append(path)
+    return files
+
+
+def read_one(path, wanted):
+    """
+    Read only the columns we need; a run dir name stands in for a missing
+    run_id. Files without `status` (UI_probe.py / UIProbe_v3.py) mark a
+    failure with -1, so their rows count as SUCCESS here.
+    """
+    keep = lambda c: RENAMES.get(c, c) in wanted
+
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        cols = [c for c in pq.read_schema(path).names if keep(c)]
+        df = pd.read_parquet(path, columns=cols)
+    elif path.endswith(".arrow"):
+        import pyarrow.feather as feather
+        df = feather.read_table(path).to_pandas()
+        df = df[[c for c in df.columns if keep(c)]]
+    else:
+        df = pd.read_csv(path, usecols=keep, low_memory=False)
+
+    df = df.rename(columns=RENAMES)
+    if "status" not in df:
+        df["status"] = "SUCCESS"
+    if "run_id" not in df:
+        df["run_id"] = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return df
+
+
+def load_results(files, metrics, keys):
+    wanted = {"timestamp_utc", "status", "run_id", *metrics, *keys}
+    frames = [read_one(f, wanted) for f in files]
+    if not frames:
+        raise SystemExit("no results files found")
+
+    df = pd.concat(frames, ignore_index=True)
+    df["timestamp_utc"] = pd.to_datetime(df["timestamp_utc"], format="ISO8601")
+
+    ok = df["status"].eq("SUCCESS")
+    for m in metrics:
+        if m not in df:
+            df[m] = float("nan")
+        # -1 / failures become NaN so quantile() and mean() skip them
+        col = pd.to_numeric(df[m], errors="coerce")
+        df[m] = col.where(ok & (col > 0)) if m != "cls" else col.where(ok)
+    return df
+
+
+# ================= AGGREGATE =================
+
+def aggregate(df, keys, metrics, pcts):
+    """One vectorized pass per group set: count/mean/min/max and every percentile."""
+    g = df.groupby(keys, sort=True, observed=True)[metrics]
+
+    stats = g.agg(["count", "mean", "min", "max"])
+    stats.columns = [f"{stat}_{m}" for m, stat in stats.columns]
+
+    q = g.quantile([p / 100 for p in pcts]).unstack(level=-1)
+    q.columns = [f"p{int(round(p * 100))}_{m}" for m, p in q.columns]
+
+    out = stats.join(q)
+    out.insert(0, "samples", g.size())
+    return out.reset_index()
+
+
+def format_report(out, metrics, pcts):
+    cols = [c for c in out.columns if not any(c.endswith(m) for m in metrics)]
+    for m in metrics:
+        cols += [f"count_{m}", f"mean_{m}"] + [f"p{p}_{m}" for p in pcts] + [f"min_{m}", f"max_{m}"]
+    return out[cols].round(3)
+
+
+# ================= MAIN =================
+
+def main():
+    args = parse_args()
+
+    metrics = [m.strip() for m in args.metrics.split(",") if m.strip()]
+    pcts = [int(p) for p in args.percentiles.split(",") if p.strip()]
+    wanted_keys = [k.strip() for k in args.by.split(",") if k.strip()]
+
+    files = expand_inputs(args.inputs)
+    df = load_results(files, metrics, wanted_keys)
+    keys = [k for k in wanted_keys if k in df]
+    # older files lack newer columns (e.g. cache); keep their rows in the groups
+    df[keys] = df[keys].fillna("")
+
+    df["bucket_start_utc"] = df["timestamp_utc"].dt.floor(args.bucket)
+
+    os.makedirs(args.out, exist_ok=True)
+    summary = format_report(aggregate(df, keys, metrics, pcts), metrics, pcts)
+    buckets = format_report(aggregate(df, ["bucket_start_utc", *keys], metrics, pcts), metrics, pcts)
+
+    summary.to_csv(os.path.join(args.out, "summary_report.csv"), index=False)
+    buckets.to_csv(os.path.join(args.out, "bucketed_performance_report.csv"), index=False)
+
+    print(f"{len(df)} rows from {len(files)} files -> "
+          f"{len(summary)} summary / {len(buckets)} bucket rows in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
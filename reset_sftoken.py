@@ -2,8 +2,11 @@ import os
 import re
 import time
 import csv
-import requests
-from playwright.sync_api import sync_playwright, TimeoutError
+import asyncio
+from playwright.async_api import async_playwright, TimeoutError
+
+from mailbox_watcher import MailboxWatcher
+from session_store import SessionStore, KEY_ENV as SESSION_KEY_ENV
 
 # ---------------- CONFIG ---------------- #
 
@@ -13,21 +16,32 @@ SF_SANDBOX_URL = os.environ["SF_SANDBOX_URL"]
 SF_DOMAIN = os.environ["SF_DOMAIN"]
 
 MAILSAC_API_KEY = os.environ["MAILSAC_API_KEY"]
+MAILSAC_BASE_URL = os.environ.get("MAILSAC_BASE_URL", "https://mailsac.com")  # point at a mock API to test
 
 MAILSAC_HEADERS = {
     "Mailsac-Key": MAILSAC_API_KEY,
     "Accept": "application/json",
 }
 
-POLL_INTERVAL = 5
+POLL_INTERVAL = 5      # first poll gap for an inbox; backs off to POLL_MAX while nothing arrives
+POLL_MAX = 20
+MAILSAC_MAX_RPS = 5    # across all inboxes
 OTP_TIMEOUT = 90
 TOKEN_TIMEOUT = 120
 
+# users rotated at once; each gets its own context in one shared browser
+CONCURRENCY = int(os.environ.get("SF_ROTATE_CONCURRENCY", "10"))
+
+# logged-in sessions are cached (encrypted) once $SESSION_STORE_KEY is set,
+# so later rotations skip the login + OTP steps until the session expires
+SESSIONS = SessionStore() if os.environ.get(SESSION_KEY_ENV) else None
+
 
 # ---------------- HELPERS ---------------- #
 
-def log(msg):
-    print(f"[+] {msg}", flush=True)
+def log(msg, user=None):
+    prefix = f"[{user}] " if user else ""
+    print(f"[+] {prefix}{msg}", flush=True)
 
 
 def derive_mailsac_email(username: str) -> str:
@@ -53,47 +67,24 @@ def load_users_from_csv():
     return users
 
 
-def get_latest_message(email):
-    r = requests.get(
-        f"https://mailsac.com/api/addresses/{email}/messages",
-        headers=MAILSAC_HEADERS,
-        timeout=20,
-    )
-    r.raise_for_status()
-    messages = r.json()
-    return messages[0] if messages else None
-
-
-def get_message_text(email, message_id):
-    r = requests.get(
-        f"https://mailsac.com/api/text/{email}/{message_id}",
-        headers=MAILSAC_HEADERS,
-        timeout=20,
-    )
-    r.raise_for_status()
-    return r.text
-
-
-def wait_for_email(email, match_fn, timeout):
-    start = time.time()
+MAILBOX = MailboxWatcher(
+    MAILSAC_HEADERS,
+    base_url=MAILSAC_BASE_URL,
+    poll_min=POLL_INTERVAL,
+    poll_max=POLL_MAX,
+    max_rps=MAILSAC_MAX_RPS,
+)
 
-    while time.time() - start < timeout:
-        msg = get_latest_message(email)
 
-        if msg:
-            body = get_message_text(email, msg["_id"])
-            if match_fn(msg, body):
-                return body
+async def wait_for_email(email, match_fn, timeout, ignore=None):
+    """Register with the shared watcher; every user's wait overlaps on one poll loop."""
+    return await asyncio.wrap_future(MAILBOX.watch(email, match_fn, timeout, ignore))
 
-        time.sleep(POLL_INTERVAL)
 
-    raise RuntimeError("Timed out waiting for email")
+async def fetch_otp(email, user):
+    log(f"Waiting for OTP email in {email}...", user)
 
-
-def fetch_otp(email):
-    log(f"Waiting for OTP email in {email}...")
-
-    body = wait_for_email(
+    body = await wait_for_email(
         email,
         lambda msg, txt: (
             "salesforce" in msg["from"][0]["address"].lower()
@@ -103,20 +94,22 @@ def fetch_otp(email):
     )
 
     otp = re.search(r"\b\d{6}\b", body).group(0)
-    log(f"OTP received: {otp}")
+    log(f"OTP received: {otp}", user)
     return otp
 
 
-def fetch_security_token(email):
-    log(f"Waiting for security token email in {email}...")
+async def fetch_security_token(email, ignore, user):
+    """Token from the first matching email whose id is not in `ignore` (the inbox before Reset)."""
+    log(f"Waiting for security token email in {email}...", user)
 
-    body = wait_for_email(
+    body = await wait_for_email(
         email,
         lambda msg, txt: (
             "token" in (msg.get("subject") or "").lower()
             or re.search(r"security token", txt, re.I)
         ),
         TOKEN_TIMEOUT,
+        ignore,
     )
 
     match = re.search(r"token\s+is\s+([A-Za-z0-9]+)", body, re.I)
@@ -124,85 +117,158 @@ def fetch_security_token(email):
         raise RuntimeError("Token not found in email")
 
     token = match.group(1)
-    log(f"New token: {token}")
+    log(f"New token: {token}", user)
     return token
 
 
 # ---------------- MAIN ---------------- #
 
-def rotate_user(user):
-    sf_username = user["username"].strip()
-    sf_password = user["password"].strip()
+async def login(page, sf_username, sf_password, mailsac_email):
+    """Username/password + email OTP. False if no MFA screen shows up."""
+    await page.goto(SF_SANDBOX_URL)
 
-    mailsac_email = derive_mailsac_email(sf_username)
+    await page.fill("#username", sf_username)
+    await page.fill("#password", sf_password)
+    await page.click("#Login")
 
-    log("=" * 60)
-    log(f"Rotating token for: {sf_username}")
-    log(f"Inbox: {mailsac_email}")
+    log("Waiting for MFA screen...", sf_username)
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context()
-        page = context.new_page()
+    try:
+        await page.wait_for_selector(
+            'input[type="tel"], input[name="otp"]', timeout=30000
+        )
+    except TimeoutError:
+        log("❌ MFA screen not detected — skipping user.", sf_username)
+        return False
 
-        page.goto(SF_SANDBOX_URL)
+    otp = await fetch_otp(mailsac_email, sf_username)
 
-        page.fill("#username", sf_username)
-        page.fill("#password", sf_password)
-        page.click("#Login")
+    await page.fill('input[type="tel"], input[name="otp"]', otp)
+    await page.click('button:has-text("Verify"), input[value="Verify"]')
 
-        log("Waiting for MFA screen...")
+    await page.wait_for_url(r"lightning.force.com", timeout=60000)
+    return True
 
-        try:
-            page.wait_for_selector(
-                'input[type="tel"], input[name="otp"]', timeout=30000
-            )
-        except TimeoutError:
-            log("❌ MFA screen not detected — skipping user.")
-            browser.close()
-            return
 
-        otp = fetch_otp(mailsac_email)
+async def open_with_session(browser, sf_username, url):
+    """Context on `url` from the saved session, or None if there is none or it was rejected."""
+    state = SESSIONS.get(sf_username) if SESSIONS else None
+    if not state:
+        return None
 
-        page.fill('input[type="tel"], input[name="otp"]', otp)
-        page.click('button:has-text("Verify"), input[value="Verify"]')
+    context = await browser.new_context(storage_state=state)
+    page = await context.new_page()
+    log("Reusing saved session...", sf_username)
+    await page.goto(url)
+    try:
+        await page.wait_for_selector('button:has-text("Reset"), #username', timeout=30000)
+        if not await page.is_visible("#username"):
+            return context
+    except TimeoutError:
+        pass
 
-        page.wait_for_url(r"lightning.force.com", timeout=60000)
+    log("Saved session rejected — logging in.", sf_username)
+    SESSIONS.invalidate(sf_username)
+    await context.close()
+    return None
 
-        reset_url = (
-            f"https://{SF_DOMAIN}.lightning.force.com/"
-            "settings/personal/ResetApiToken/home"
-        )
 
-        log("Navigating to reset token page...")
-        page.goto(reset_url)
+async def rotate_user(browser, user):
+    """One user's login -> MFA -> reset flow in its own context of the shared browser."""
+    sf_username = user["username"].strip()
+    sf_password = user["password"].strip()
+
+    mailsac_email = derive_mailsac_email(sf_username)
+
+    log(f"Rotating token (inbox: {mailsac_email})", sf_username)
+
+    reset_url = (
+        f"https://{SF_DOMAIN}.lightning.force.com/"
+        "settings/personal/ResetApiToken/home"
+    )
+
+    context = await open_with_session(browser, sf_username, reset_url)
+    try:
+        if context:
+            page = context.pages[0]
+        else:
+            context = await browser.new_context()
+            page = await context.new_page()
+            if not await login(page, sf_username, sf_password, mailsac_email):
+                return None
+            if SESSIONS:
+                SESSIONS.save(sf_username, await context.storage_state())
+
+            log("Navigating to reset token page...", sf_username)
+            await page.goto(reset_url)
+
+        await page.wait_for_selector('button:has-text("Reset")', timeout=30000)
 
-        page.wait_for_selector('button:has-text("Reset")', timeout=30000)
-        page.click('button:has-text("Reset")')
+        # the newest email may be the previous rotation's token (no OTP
+        # arrives when a saved session skips login), so only accept later ones
+        seen = await asyncio.to_thread(MAILBOX.message_ids, mailsac_email)
+        await page.click('button:has-text("Reset")')
 
         try:
-            page.wait_for_selector('button:has-text("OK")', timeout=5000)
-            page.click('button:has-text("OK")')
+            await page.wait_for_selector('button:has-text("OK")', timeout=5000)
+            await page.click('button:has-text("OK")')
         except TimeoutError:
             pass
 
-        token = fetch_security_token(mailsac_email)
+        # the browser is no longer needed while the token email arrives
+        await context.close()
+        context = None
 
-        log(f"🎉 TOKEN ROTATED for {sf_username}")
-        log(token)
+        token = await fetch_security_token(mailsac_email, seen, sf_username)
 
-        browser.close()
+        log("🎉 TOKEN ROTATED", sf_username)
+        log(token, sf_username)
+        return token
+
+    finally:
+        if context:
+            await context.close()
+
+
+async def rotate_all(users, concurrency=CONCURRENCY):
+    """
+    Rotate every user over one Chromium, at most `concurrency` at a time.
+    Returns {username: token or None}.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    results = {}
+
+    async def one(user, browser):
+        async with sem:
+            try:
+                results[user["username"]] = await rotate_user(browser, user)
+            except Exception as e:
+                results[user["username"]] = None
+                log(f"❌ FAILED: {e}", user["username"])
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            await asyncio.gather(*(one(u, browser) for u in users))
+        finally:
+            await browser.close()
+
+    return results
 
 
 def main():
     users = load_users_from_csv()
-    log(f"Loaded {len(users)} users from CSV.")
+    log(f"Loaded {len(users)} users from CSV; rotating {CONCURRENCY} at a time.")
 
-    for user in users:
-        try:
-            rotate_user(user)
-        except Exception as e:
-            log(f"❌ FAILED for {user['username']}: {e}")
+    start = time.time()
+    try:
+        results = asyncio.run(rotate_all(users))
+    finally:
+        MAILBOX.close()
+
+    ok = sum(1 for t in results.values() if t)
+    log(f"{ok}/{len(users)} tokens rotated in {time.time() - start:,.0f}s "
+        f"({MAILBOX.requests} mail API calls)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+import os
+import time
+import threading
+from collections import deque
+
+
+# ================= HOST TELEMETRY =================
+
+TELEMETRY_HEADER = [
+    "timestamp_utc", "host_cpu", "host_mem", "load_per_cpu",
+    "probe_cpu", "probe_rss_mb", "browser_cpu", "browser_rss_mb",
+    "browser_procs", "saturated"
+]
+
+
+class HostMonitor:
+    """
+    Samples CPU and RSS of this process and its whole child tree (the
+    Playwright driver and every Chromium process) plus host CPU / memory
+    every `interval` seconds from a daemon thread, and hands each reading to
+    `on_reading`.
+
+    The host counts as saturated when host CPU or memory is at or above its
+    limit, or the probe process itself pins a core (the Python side then
+    delays every event it handles). saturated_since() tells a probe whether
+    any reading during its sample was saturated.
+    """
+
+    def __init__(self, interval=5, cpu_limit=90, mem_limit=90, on_reading=None):
+        import psutil
+
+        self.psutil = psutil
+        self.interval = interval
+        self.cpu_limit, self.mem_limit = cpu_limit, mem_limit
+        self.on_reading = on_reading
+
+        self.me = psutil.Process()
+        self.children = {}            # pid -> Process, kept so cpu_percent() has a baseline
+        self.recent = deque(maxlen=max(int(600 / interval), 2))    # (time, saturated)
+        self.last = None
+
+        self.stop = threading.Event()
+        self.me.cpu_percent()
+        psutil.cpu_percent()
+        self.thread = threading.Thread(target=self._run, name="host-telemetry", daemon=True)
+        self.thread.start()
+
+    def _tree(self):
+        live = {}
+        for p in self.me.children(recursive=True):
+            proc = self.children.get(p.pid) or p
+            if proc is p:
+                p.cpu_percent()        # first call only primes the counter
+            live[p.pid] = proc
+        self.children = live
+        return live.values()
+
+    def read(self):
+        ps = self.psutil
+        cpu, rss, n = 0.0, 0, 0
+        for p in self._tree():
+            try:
+                cpu += p.cpu_percent()
+                rss += p.memory_info().rss
+                n += 1
+            except (ps.NoSuchProcess, ps.AccessDenied):
+                pass
+
+        host_cpu = ps.cpu_percent()
+        host_mem = ps.virtual_memory().percent
+        probe_cpu = self.me.cpu_percent()
+        load = os.getloadavg()[0] / (os.cpu_count() or 1) if hasattr(os, "getloadavg") else -1
+
+        saturated = host_cpu >= self.cpu_limit or host_mem >= self.mem_limit or probe_cpu >= 95
+        return {
+            "ts": time.time(),
+            "host_cpu": host_cpu, "host_mem": host_mem, "load_per_cpu": round(load, 2),
+            "probe_cpu": probe_cpu, "probe_rss_mb": round(self.me.memory_info().rss / 2**20, 1),
+            "browser_cpu": round(cpu, 1), "browser_rss_mb": round(rss / 2**20, 1),
+            "browser_procs": n, "saturated": saturated,
+        }
+
+    def _run(self):
+        while not self.stop.wait(self.interval):
+            try:
+                r = self.read()
+            except Exception as e:
+                print(f"[telemetry] read failed: {e}")
+                continue
+            self.last = r
+            self.recent.append((r["ts"], r["saturated"]))
+            if self.on_reading:
+                self.on_reading(r)
+
+    def saturated_since(self, start):
+        """Was any reading from `start` (time.time()) until now saturated?"""
+        # a reading covers the interval before it: the last one before
+        # `start` describes the moments leading into the sample
+        return any(sat for ts, sat in list(self.recent) if ts >= start - self.interval)
+
+    def close(self):
+        self.stop.set()
+        self.thread.join()
+
+
+def start(interval, cpu_limit, mem_limit, on_reading=None):
+    """HostMonitor, or None (with a notice) when psutil is not installed."""
+    if not interval:
+        return None
+    try:
+        return HostMonitor(interval, cpu_limit, mem_limit, on_reading)
+    except ImportError:
+        print("[telemetry] psutil not installed; host telemetry and saturation checks are off")
+        return None
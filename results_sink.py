@@ -0,0 +1,206 @@
+import csv
+import os
+import time
+from abc import ABC, abstractmethod
+
+
+# ================= SINKS =================
+#
+# A sink buffers raw result rows and writes them out every `flush_rows`
+# rows or `flush_secs` seconds, whichever comes first. All sinks take the
+# same header list and plain row lists, so probes can swap them freely.
+
+class ResultsSink(ABC):
+    ext = ""
+
+    def __init__(self, path, header, flush_rows=500, flush_secs=10):
+        self.path = path
+        self.header = list(header)
+        self.flush_rows = flush_rows
+        self.flush_secs = flush_secs
+
+        self.buffer = []
+        self.last_flush = time.time()
+        self.rows = 0
+
+    def write(self, row):
+        self.buffer.append(row)
+        self.rows += 1
+        if len(self.buffer) >= self.flush_rows or time.time() - self.last_flush >= self.flush_secs:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self._write_batch(self.buffer)
+            self.buffer = []
+        self.last_flush = time.time()
+
+    @abstractmethod
+    def _write_batch(self, rows):
+        """Write one flushed batch of row lists."""
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvSink(ResultsSink):
+    ext = ".csv"
+
+    def __init__(self, path, header, **opts):
+        super().__init__(path, header, **opts)
+        self.f = open(path, "w", newline="")
+        self.w = csv.writer(self.f)
+        self.w.writerow(self.header)
+
+    def _write_batch(self, rows):
+        self.w.writerows(rows)
+        self.f.flush()
+
+    def close(self):
+        super().close()
+        self.f.close()
+
+
+class RotatingCsvSink(ResultsSink):
+    """results.csv -> results.0000.csv, results.0001.csv, ... every `rotate_rows` rows."""
+
+    ext = ".csv"
+
+    def __init__(self, path, header, rotate_rows=1_000_000, **opts):
+        super().__init__(path, header, **opts)
+        self.rotate_rows = rotate_rows
+        self.part = -1
+        self.part_rows = 0
+        self.f = None
+        self._rotate()
+
+    def _rotate(self):
+        if self.f:
+            self.f.close()
+        self.part += 1
+        self.part_rows = 0
+        stem, ext = os.path.splitext(self.path)
+        self.f = open(f"{stem}.{self.part:04d}{ext}", "w", newline="")
+        self.w = csv.writer(self.f)
+        self.w.writerow(self.header)
+
+    def _write_batch(self, rows):
+        i = 0
+        while i < len(rows):
+            room = self.rotate_rows - self.part_rows
+            if room <= 0:
+                self._rotate()
+                continue
+            chunk = rows[i:i + room]
+            self.w.writerows(chunk)
+            self.part_rows += len(chunk)
+            i += len(chunk)
+        self.f.flush()
+
+    def close(self):
+        super().close()
+        self.f.close()
+
+
+class ArrowSink(ResultsSink):
+    """
+    Columnar sink: each flush becomes one Parquet row group (or Arrow IPC
+    record batch). Column types come from `schema` ({column: pyarrow type
+    or alias like "int64"}) or are inferred from the first batch and then
+    fixed for the file. Rows may use "" for a missing value, as in the csv
+    sinks; it is written as null in any non-string column.
+
+    Not crash-safe: both formats put their footer at the end, written by
+    close(), so a file from a killed process can't be read. Use a csv sink
+    when runs may die mid-way.
+    """
+
+    def __init__(self, path, header, schema=None, compression="zstd", **opts):
+        import pyarrow as pa
+
+        opts.setdefault("flush_rows", 50_000)
+        opts.setdefault("flush_secs", 60)
+        super().__init__(path, header, **opts)
+        self.pa = pa
+        self.compression = compression
+        self.schema = pa.schema([
+            (c, pa.type_for_alias(schema[c]) if isinstance(schema[c], str) else schema[c])
+            for c in self.header
+        ]) if schema else None
+        self.writer = None
+
+    @abstractmethod
+    def _open_writer(self):
+        """Writer for self.path and self.schema, with write_table() and close()."""
+
+    def _write_batch(self, rows):
+        pa = self.pa
+        columns = list(zip(*rows))
+        if self.schema is None:
+            arrays = [self._array(col) for col in columns]
+            self.schema = pa.schema([(c, a.type) for c, a in zip(self.header, arrays)])
+        else:
+            arrays = [self._array(col, f.type) for col, f in zip(columns, self.schema)]
+
+        if self.writer is None:
+            self.writer = self._open_writer()
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def _array(self, values, type=None):
+        types = self.pa.types
+        if type is None:
+            blank_is_null = any(v != "" and not isinstance(v, str) for v in values)
+        else:
+            blank_is_null = not (types.is_string(type) or types.is_large_string(type))
+        if blank_is_null:
+            values = [None if v == "" else v for v in values]
+        return self.pa.array(values, type=type)
+
+    def close(self):
+        super().close()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class ParquetSink(ArrowSink):
+    ext = ".parquet"
+
+    def _open_writer(self):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(self.path, self.schema, compression=self.compression)
+
+
+class ArrowIpcSink(ArrowSink):
+    ext = ".arrow"
+
+    def _open_writer(self):
+        import pyarrow.ipc as ipc
+
+        self.file = self.pa.OSFile(self.path, "wb")
+        return ipc.new_file(self.file, self.schema)
+
+    def close(self):
+        super().close()
+        if self.writer is not None:
+            self.file.close()
+
+
+SINKS = {
+    "csv": CsvSink,
+    "csv-rotating": RotatingCsvSink,
+    "parquet": ParquetSink,
+    "arrow": ArrowIpcSink,
+}
+
+
+def open_sink(kind, path, header, **opts):
+    """`path` keeps its stem; the extension follows the sink (results.csv -> results.parquet)."""
+    cls = SINKS[kind]
+    path = os.path.splitext(path)[0] + cls.ext
+    return cls(path, header, **opts)
@@ -0,0 +1,36 @@
+import inspect
+
+from scenarios.login_journey import login_journey
+from scenarios.add_to_cart_journey import add_to_cart_journey
+from scenarios.checkout_journey import checkout_journey
+
+# name -> journey(page, step). `step(name)` is a context manager that times
+# the block as one step; a journey taking only `page` is timed as one step.
+SCENARIOS = {
+    "login": login_journey,
+    "add_to_cart": add_to_cart_journey,
+    "checkout": checkout_journey
+}
+
+
+def register(name):
+    """Decorator for journeys defined outside this module."""
+    def wrap(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return wrap
+
+
+def get(name):
+    try:
+        fn = SCENARIOS[name]
+    except KeyError:
+        raise SystemExit(f"unknown scenario {name!r}; known: {', '.join(sorted(SCENARIOS))}")
+
+    if len(inspect.signature(fn).parameters) >= 2:
+        return fn
+
+    def single_step(page, step):
+        with step("journey"):
+            fn(page)
+    return single_step
@@ -0,0 +1,10 @@
+def add_to_cart_journey(page, step):
+    with step("home"):
+        page.goto("https://example.com")
+
+    with step("open_product"):
+        page.click(".product-card:first-child")
+
+    with step("add_to_cart"):
+        page.click("#add-to-cart")
+        page.wait_for_selector("#cart-count")
@@ -0,0 +1,7 @@
+def checkout_journey(page, step):
+    with step("cart"):
+        page.goto("https://example.com/cart")
+
+    with step("checkout"):
+        page.click("#checkout")
+        page.wait_for_selector("#order-confirmation")
@@ -0,0 +1,9 @@
+def login_journey(page, step):
+    with step("open_login"):
+        page.goto("https://example.com/login")
+
+    with step("submit_login"):
+        page.fill("#username", "test_user")
+        page.fill("#password", "password123")
+        page.click("button[type=submit]")
+        page.wait_for_selector("#dashboard")
@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+
+DEFAULT_DIR = os.environ.get("SESSION_STORE_DIR", "sessions")
+KEY_ENV = "SESSION_STORE_KEY"
+
+DEFAULT_TTL = 2 * 3600      # used when no auth cookie carries an expiry
+EXPIRY_MARGIN = 300         # treat a session as expired this long before it really is
+
+# cookies whose expiry bounds the session (Salesforce "sid"); others are ignored
+AUTH_COOKIES = ("sid",)
+
+
+# ================= STORE =================
+
+class SessionStore:
+    """
+    Playwright storage_state (cookies + localStorage) per user, encrypted
+    with Fernet under the key in $SESSION_STORE_KEY, one file per user.
+
+        state = store.get(user)            # None if missing or expired
+        ctx = browser.new_context(storage_state=state)
+        ...
+        store.save(user, ctx.storage_state())
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, key=None, ttl=DEFAULT_TTL):
+        from cryptography.fernet import Fernet
+
+        key = key or os.environ.get(KEY_ENV)
+        if not key:
+            raise SystemExit(f"${KEY_ENV} is not set; create one with: python session_store.py keygen")
+        self.fernet = Fernet(key)
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, user):
+        name = hashlib.sha256(user.strip().lower().encode()).hexdigest()[:32]
+        return os.path.join(self.directory, f"{name}.session")
+
+    def _read(self, user):
+        from cryptography.fernet import InvalidToken
+
+        try:
+            with open(self.path(user), "rb") as f:
+                return json.loads(self.fernet.decrypt(f.read()))
+        except FileNotFoundError:
+            return None
+        except (InvalidToken, ValueError):
+            # written under another key or damaged: same as no session
+            return None
+
+    def get(self, user):
+        """The saved storage_state, or None when missing or about to expire."""
+        entry = self._read(user)
+        if not entry or entry["expires"] - EXPIRY_MARGIN <= time.time():
+            return None
+        return entry["state"]
+
+    def expiry(self, state):
+        """Earliest auth-cookie expiry, capped at now + ttl."""
+        limit = time.time() + self.ttl
+        expiries = [
+            c["expires"] for c in state.get("cookies", [])
+            if c.get("name") in AUTH_COOKIES and c.get("expires", -1) > 0
+        ]
+        return min(expiries + [limit])
+
+    def save(self, user, state, expires=None):
+        entry = {
+            "user": user,
+            "saved": time.time(),
+            "expires": expires or self.expiry(state),
+            "state": state,
+        }
+        path = self.path(user)
+        tmp = path + ".tmp"
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+            f.write(self.fernet.encrypt(json.dumps(entry).encode()))
+        os.replace(tmp, path)
+
+    def invalidate(self, user):
+        try:
+            os.remove(self.path(user))
+        except FileNotFoundError:
+            pass
+
+    def entries(self):
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".session"):
+                continue
+            with open(os.path.join(self.directory, name), "rb") as f:
+                try:
+                    entry = json.loads(self.fernet.decrypt(f.read()))
+                except Exception:
+                    continue
+            yield entry
+
+
+# ================= CLI =================
+
+def main():
+    parser = argparse.ArgumentParser("Encrypted Playwright session store")
+    parser.add_argument("--dir", default=DEFAULT_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("keygen", help=f"print a new key for ${KEY_ENV}")
+    sub.add_parser("list", help="saved sessions and their expiry")
+    d = sub.add_parser("drop", help="forget one user's session")
+    d.add_argument("user")
+    args = parser.parse_args()
+
+    if args.cmd == "keygen":
+        from cryptography.fernet import Fernet
+        print(Fernet.generate_key().decode())
+        return 0
+
+    store = SessionStore(args.dir)
+    if args.cmd == "list":
+        now = time.time()
+        for e in store.entries():
+            left = e["expires"] - now
+            print(e["user"], f"{left / 60:,.0f} min left" if left > 0 else "expired", sep="\t")
+    else:
+        store.invalidate(args.user)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
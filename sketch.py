@@ -0,0 +1,115 @@
+import math
+
+
+# Values at or below this land in the zero bucket (CLS is often exactly 0)
+MIN_VALUE = 1e-9
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class QuantileSketch:
+    """
+    DDSketch-style quantile sketch.
+
+    Samples are counted in logarithmic buckets, so every quantile is within
+    `alpha` relative error, inserts are O(1) and memory is capped at
+    `max_bins` buckets no matter how many samples go in. Sketches built with
+    the same `alpha` merge exactly by adding bucket counts.
+    """
+
+    def __init__(self, alpha=0.01, max_bins=2048):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.max_bins = max_bins
+
+        self.bins = {}
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self):
+        return self.count
+
+    def add(self, v, n=1):
+        self.count += n
+        self.sum += v * n
+        self.min = min(self.min, v)
+        self.max = max(self.max, v)
+
+        if v <= MIN_VALUE:
+            self.zeros += n
+            return
+
+        k = math.ceil(math.log(v) / self.log_gamma)
+        self.bins[k] = self.bins.get(k, 0) + n
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        # fold the lowest buckets together; tail quantiles keep full accuracy
+        keys = sorted(self.bins)
+        extra = len(keys) - self.max_bins
+        into = keys[extra]
+        for k in keys[:extra]:
+            self.bins[into] += self.bins.pop(k)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if other.gamma != self.gamma:
+            raise ValueError("cannot merge sketches with different alpha")
+
+        for k, n in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        return self
+
+    def value(self, k):
+        """Representative value of bucket `k`."""
+        return 2 * self.gamma ** k / (self.gamma + 1)
+
+    def quantile(self, pct):
+        if not self.count:
+            return -1
+
+        rank = (pct / 100) * (self.count - 1)
+        if rank < self.zeros:
+            return max(self.min, 0)
+
+        seen = self.zeros
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                return min(max(self.value(k), self.min), self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.count if self.count else -1
+
+    def to_dict(self):
+        return {
+            "alpha": self.alpha, "max_bins": self.max_bins,
+            "bins": {str(k): n for k, n in self.bins.items()},
+            "zeros": self.zeros, "count": self.count, "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d["alpha"], d["max_bins"])
+        s.bins = {int(k): n for k, n in d["bins"].items()}
+        s.zeros, s.count, s.sum = d["zeros"], d["count"], d["sum"]
+        if s.count:
+            s.min, s.max = d["min"], d["max"]
+        return s
@@ -0,0 +1,255 @@
+import csv
+import json
+import math
+import time
+import queue
+import threading
+import urllib.request
+from datetime import datetime
+
+from sketch import QuantileSketch
+
+
+# ================= THRESHOLDS =================
+
+def load_slos(path, defaults):
+    """
+    url -> {"p90_ms", "lcp_p90_ms", "error_rate"}. CSV with a `url` column
+    and any of the threshold columns; blanks and unknown urls use `defaults`.
+    0 disables a threshold.
+    """
+    slos = {}
+    if path:
+        with open(path, newline="") as f:
+            for r in csv.DictReader(f):
+                slos[r["url"]] = defaults | {k: float(r[k]) for k in defaults if r.get(k)}
+    return slos
+
+
+# ================= DETECTION =================
+
+class RollingSketch:
+    """Quantiles over the last one to two `window` seconds: two sketches, rotated."""
+
+    def __init__(self, window):
+        self.window = window
+        self.started = time.time()
+        self.prev = QuantileSketch()
+        self.cur = QuantileSketch()
+
+    def add(self, v):
+        now = time.time()
+        if now - self.started >= self.window:
+            self.prev, self.cur = self.cur, QuantileSketch()
+            self.started = now
+        self.cur.add(v)
+
+    def merged(self):
+        s = QuantileSketch()
+        s.merge(self.prev)
+        s.merge(self.cur)
+        return s
+
+
+class Detector:
+    """
+    Online state of one (url, cache):
+
+    - rolling p90 of duration and LCP, compared with the SLO
+    - EWMA of the error indicator, compared with the SLO error rate
+    - one-sided CUSUM on log(duration) against a slow EWMA baseline; it
+      flags a shift up well before the p90 crosses a fixed threshold
+    """
+
+    ALPHA = 0.05          # baseline EWMA weight
+    ERR_ALPHA = 0.1
+    CUSUM_K = 0.5         # slack, in baseline standard deviations
+    CUSUM_H = 5.0         # decision threshold
+    Z_CAP = 3.0
+    WARMUP = 10           # samples before any verdict
+
+    def __init__(self, window):
+        self.duration = RollingSketch(window)
+        self.lcp = RollingSketch(window)
+        self.err = 0.0
+        self.n = 0
+        self.mean = self.var = None
+        self.cusum = 0.0
+        self.shifted_at = 0.0
+        self.breached = set()
+        self.stable_for = 0
+
+    def update(self, s):
+        """Feed one sample; returns the old baseline (ms) when the change-point test fires."""
+        self.n += 1
+        failed = s["status"] != "SUCCESS"
+        self.err += self.ERR_ALPHA * (failed - self.err)
+        if failed or s["duration"] <= 0:
+            return None
+
+        self.duration.add(s["duration"])
+        if s["lcp"] > 0:
+            self.lcp.add(s["lcp"])
+
+        x = math.log(s["duration"])
+        if self.mean is None:
+            self.mean, self.var = x, 0.0
+            return None
+
+        # z is capped so one outlier can't fire the test alone; it takes a
+        # few slow samples in a row
+        sd = max(math.sqrt(self.var), 0.05)
+        z = min((x - self.mean) / sd, self.Z_CAP)
+        self.cusum = max(0.0, self.cusum + z - self.CUSUM_K)
+        fired = self.n > self.WARMUP and self.cusum > self.CUSUM_H
+
+        if fired:
+            # re-baseline on the new level so one shift raises one event
+            old = math.exp(self.mean)
+            self.mean, self.cusum = x, 0.0
+            self.shifted_at = time.time()
+            return old
+
+        d = x - self.mean
+        self.mean += self.ALPHA * d
+        self.var = (1 - self.ALPHA) * (self.var + self.ALPHA * d * d)
+        return None
+
+    def violations(self, slo):
+        if self.n < self.WARMUP:
+            return {}
+        out = {}
+        p90 = self.duration.merged().quantile(90)
+        lcp90 = self.lcp.merged().quantile(90)
+        if slo["p90_ms"] and p90 > slo["p90_ms"]:
+            out["p90_ms"] = round(p90)
+        if slo["lcp_p90_ms"] and lcp90 > slo["lcp_p90_ms"]:
+            out["lcp_p90_ms"] = round(lcp90)
+        if slo["error_rate"] and self.err > slo["error_rate"]:
+            out["error_rate"] = round(self.err, 3)
+        return out
+
+
+# ================= EVENTS =================
+
+class EventSink:
+    """Appends events to a JSONL file and POSTs them to a webhook from a background thread."""
+
+    def __init__(self, path=None, webhook=None, timeout=5):
+        self.f = open(path, "a") if path else None
+        self.webhook = webhook
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.q = queue.Queue(maxsize=1000)
+        self.thread = None
+        if webhook:
+            self.thread = threading.Thread(target=self._post_loop, name="slo-webhook", daemon=True)
+            self.thread.start()
+
+    def emit(self, event):
+        line = json.dumps(event)
+        print(f"[slo] {line}", flush=True)
+        with self.lock:
+            if self.f:
+                self.f.write(line + "\n")
+                self.f.flush()
+        if self.thread:
+            try:
+                self.q.put_nowait(line)
+            except queue.Full:
+                pass
+
+    def _post_loop(self):
+        while True:
+            line = self.q.get()
+            if line is None:
+                return
+            req = urllib.request.Request(
+                self.webhook, data=line.encode(), headers={"Content-Type": "application/json"}
+            )
+            try:
+                urllib.request.urlopen(req, timeout=self.timeout).close()
+            except Exception as e:
+                print(f"[slo] webhook failed: {e}", flush=True)
+
+    def close(self):
+        if self.thread:
+            self.q.put(None)
+            self.thread.join(self.timeout * 2)
+        if self.f:
+            self.f.close()
+
+
+# ================= MONITOR =================
+
+class SloMonitor:
+    """
+    Fed by Recorder.record(). Raises breach / recovery / shift events as soon
+    as a sample crosses a line, and with `on_rate` set, asks the scheduler to
+    sample a target `boost` times faster while it is degrading and `relax`
+    times slower once it has been stable for `stable_after` samples.
+    """
+
+    def __init__(self, env, run_id, slos, defaults, events, window=300,
+                 on_rate=None, boost=4.0, relax=2.0, stable_after=30, hold=None):
+        self.env, self.run_id = env, run_id
+        self.slos, self.defaults = slos, defaults
+        self.events = events
+        self.window = window
+        self.on_rate = on_rate
+        self.boost, self.relax = boost, relax
+        self.stable_after = stable_after
+        self.hold = hold or window     # keep the boost this long after a shift
+        self.detectors = {}
+        self.rates = {}
+        self.lock = threading.Lock()
+
+    def _event(self, kind, s, **fields):
+        self.events.emit({
+            "ts": datetime.utcnow().isoformat(), "event": kind,
+            "env": self.env, "run_id": self.run_id,
+            "url": s["url"], "cache": s["cache"],
+        } | fields)
+
+    def observe(self, s):
+        key = (s["url"], s["cache"])
+        target = s.get("journey") or s["url"]
+        slo = self.slos.get(s["url"], self.defaults)
+
+        with self.lock:
+            d = self.detectors.get(key)
+            if d is None:
+                d = self.detectors[key] = Detector(self.window)
+
+            baseline = d.update(s)
+            if baseline is not None:
+                self._event("shift", s, baseline_ms=round(baseline), sample_ms=s["duration"])
+
+            now_bad = d.violations(slo)
+            for metric in now_bad.keys() - d.breached:
+                self._event("breach", s, metric=metric, value=now_bad[metric], slo=slo[metric])
+            for metric in d.breached - now_bad.keys():
+                self._event("recovered", s, metric=metric, slo=slo[metric])
+            d.breached = set(now_bad)
+
+            degrading = bool(now_bad) or time.time() - d.shifted_at < self.hold
+            d.stable_for = 0 if degrading else d.stable_for + 1
+
+            if self.on_rate:
+                if degrading:
+                    rate = self.boost
+                elif d.stable_for >= self.stable_after:
+                    rate = 1 / self.relax
+                else:
+                    rate = 1.0
+                self._set_rate(key, target, rate)
+
+    def _set_rate(self, key, target, rate):
+        if self.rates.get(key, (target, 1.0))[1] == rate:
+            return
+        self.rates[key] = (target, rate)
+        # one target can feed several detectors (cold + warm, journey steps): fastest wins
+        self.on_rate(target, max(r for t, r in self.rates.values() if t == target))
+
+    def close(self):
+        self.events.close()
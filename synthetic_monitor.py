@@ -1,15 +1,30 @@
 import time
 import csv
 import math
-import statistics
+import heapq
 import os
+import json
 import uuid
 import argparse
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from collections import defaultdict
+from contextlib import contextmanager
 
 import pandas as pd
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import sync_playwright
+
+import distributed
+import failures
+import history
+import prom_exporter
+import resource_monitor
+import scenario_registry
+import session_store
+import slo
+from context_pool import ContextPool, MODES as CONTEXT_MODES
+from results_sink import SINKS, ArrowSink, open_sink
+from sketch import QuantileSketch
 
 
 # ================= CLI =================
@@ -17,37 +32,153 @@ from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeo
 def parse_args():
     parser = argparse.ArgumentParser("Synthetic Web Performance Monitor")
     parser.add_argument("--env", default="staging")
+    parser.add_argument("--mode", choices=("url", "scenario"), default="url",
+                        help="url: load each URL; scenario: run journeys from --scenarios step by step")
     parser.add_argument("--urls", default="urls.txt")
+    parser.add_argument("--scenarios", default="scenarios.txt",
+                        help="scenario names (see scenario_registry.py), optional interval_s after each")
     parser.add_argument("--duration", type=int, default=30)
     parser.add_argument("--delay", type=int, default=5)
     parser.add_argument("--bucket", type=int, default=5)
-    return parser.parse_args()
+    parser.add_argument("--grace", type=int, default=90,
+                        help="seconds after a bucket ends before it is finalized")
+    # 0 keeps the serial loop; N > 0 runs N browsers on a fixed-rate schedule
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--interval", type=int, default=60,
+                        help="default seconds between samples of one URL (--workers mode)")
+    parser.add_argument("--context-mode", choices=CONTEXT_MODES, default="warm",
+                        help="warm: reuse one context (its first sample is tagged cold); "
+                             "cold: fresh context per sample; paired: cold then warm sample of each URL")
+    parser.add_argument("--context-max-uses", type=int, default=0,
+                        help="recycle a reused context after this many samples (0 = never); "
+                             "the sample after a recycle is tagged cold")
+    parser.add_argument("--context-max-heap-mb", type=int, default=0,
+                        help="recycle a reused context once page JS heap exceeds this (0 = off)")
+    parser.add_argument("--context-spares", type=int, default=2,
+                        help="pre-created contexts kept ready in cold/paired mode")
+    parser.add_argument("--sink", choices=sorted(SINKS), default="csv",
+                        help="format of the raw results file; parquet/arrow are only readable "
+                             "after a clean exit (their footer is written on close), csv sinks "
+                             "keep every flushed row if the probe is killed")
+    parser.add_argument("--sink-rows", type=int, default=500,
+                        help="buffer this many raw rows before writing")
+    parser.add_argument("--sink-secs", type=int, default=10,
+                        help="write buffered raw rows at least this often")
+    parser.add_argument("--history-db", default=history.DEFAULT_DB,
+                        help="SQLite run index for history.py compare ('' = off)")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="serve live Prometheus /metrics on this port (0 = off)")
+    parser.add_argument("--network", action="store_true",
+                        help="capture per-request timings (url mode): request counts in the raw "
+                             "results and the slowest resources per bucket")
+    parser.add_argument("--network-top", type=int, default=10,
+                        help="slowest resources kept per url and bucket (--network)")
+    parser.add_argument("--har-percentile", type=float, default=0,
+                        help="write a HAR for samples at or above this duration percentile "
+                             "of their url, e.g. 95 (--network; 0 = off)")
+    parser.add_argument("--slo", default="",
+                        help="per-url SLO CSV: url,p90_ms,lcp_p90_ms,error_rate (blank = the defaults below)")
+    parser.add_argument("--slo-p90-ms", type=float, default=0,
+                        help="default p90 load-time SLO (0 = off)")
+    parser.add_argument("--slo-lcp-p90-ms", type=float, default=0,
+                        help="default p90 LCP SLO (0 = off)")
+    parser.add_argument("--slo-error-rate", type=float, default=0,
+                        help="default error-rate SLO, e.g. 0.05 (0 = off)")
+    parser.add_argument("--slo-window", type=int, default=0,
+                        help="seconds of samples behind the rolling p90 (default: one bucket)")
+    parser.add_argument("--alert-webhook", default="",
+                        help="POST each SLO event as JSON to this URL")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="--workers mode: sample degrading urls faster and stable ones slower")
+    parser.add_argument("--min-interval", type=int, default=5,
+                        help="fastest adaptive sampling interval in seconds")
+    parser.add_argument("--telemetry-secs", type=int, default=5,
+                        help="sample CPU/RSS of the probe, browser tree and host this often (0 = off; needs psutil)")
+    parser.add_argument("--saturation-cpu", type=float, default=90,
+                        help="host CPU %% at which samples count as taken on a saturated host")
+    parser.add_argument("--saturation-mem", type=float, default=90,
+                        help="host memory %% at which samples count as taken on a saturated host")
+    parser.add_argument("--saturated", choices=("flag", "drop"), default="flag",
+                        help="flag: mark saturated samples in the raw results; "
+                             "drop: also keep them out of every aggregate")
+    parser.add_argument("--role", choices=("standalone", "coordinator", "agent"), default="standalone",
+                        help="coordinator: shard targets over agents and write the reports; "
+                             "agent: run the browsers for a coordinator (see distributed.py)")
+    parser.add_argument("--listen", default="0.0.0.0:7070",
+                        help="coordinator address agents connect to")
+    parser.add_argument("--coordinator", default="127.0.0.1:7070",
+                        help="agent: coordinator address")
+    parser.add_argument("--agent-name", default="",
+                        help="agent: stable name (default host-pid); reconnecting with it replaces the old agent")
+    parser.add_argument("--session-user", default="",
+                        help="probe logged in with this user's saved session (see session_store.py)")
+    parser.add_argument("--session-dir", default=session_store.DEFAULT_DIR)
+    parser.add_argument("--timeout", type=float, default=60,
+                        help="navigation timeout in seconds")
+    parser.add_argument("--fail-on-js-error", action="store_true",
+                        help="url mode: count a load with uncaught page exceptions as a JS_ERROR failure")
+    parser.add_argument("--breaker-failures", type=int, default=3,
+                        help="open a target's circuit breaker after this many failed visits in a row (0 = off)")
+    parser.add_argument("--breaker-cooldown", type=int, default=60,
+                        help="seconds an open breaker fails visits fast before letting one through")
+    parser.add_argument("--breaker-max-cooldown", type=int, default=600,
+                        help="the cooldown doubles on each failed retry, up to this")
+    parser.add_argument("--shots-per-min", type=int, default=10,
+                        help="at most this many failure screenshots per minute")
+    parser.add_argument("--shot-every", type=int, default=300,
+                        help="at most one failure screenshot per target this often (seconds)")
+    parser.add_argument("--shot-max-kb", type=int, default=300,
+                        help="skip screenshots still larger than this at low JPEG quality")
+    parser.add_argument("--shot-quality", type=int, default=60)
+    args = parser.parse_args()
+
+    if args.interval <= 0 or args.min_interval <= 0:
+        parser.error("--interval and --min-interval must be positive")
+    if args.bucket <= 0:
+        parser.error("--bucket must be positive")
+    return args
 
 
 # ================= UTILS =================
 
-def load_urls(file_path):
+def load_targets(file_path, default_interval):
+    """
+    (url, interval_s) pairs. CSV may carry an `interval_s` column,
+    text files an optional second field: `https://example.com 30`.
+    """
     if file_path.endswith(".csv"):
-        return pd.read_csv(file_path)["url"].dropna().tolist()
+        df = pd.read_csv(file_path).dropna(subset=["url"])
+        if "interval_s" not in df:
+            return [(u, default_interval) for u in df["url"]]
+        return check_intervals([
+            (u, int(i) if i == i else default_interval)
+            for u, i in zip(df["url"], df["interval_s"])
+        ])
+
+    targets = []
     with open(file_path) as f:
-        return [l.strip() for l in f if l.strip()]
+        for l in f:
+            parts = l.split()
+            if parts:
+                targets.append((parts[0], int(parts[1]) if len(parts) > 1 else default_interval))
+    return check_intervals(targets)
 
 
-def percentile(data, pct):
-    if not data:
-        return -1
-    data = sorted(data)
-    k = (len(data) - 1) * (pct / 100)
-    f, c = math.floor(k), math.ceil(k)
-    return data[int(k)] if f == c else data[f] + (data[c] - data[f]) * (k - f)
+def check_intervals(targets):
+    for url, interval in targets:
+        if interval <= 0:
+            raise SystemExit(f"interval for {url} must be positive, got {interval}")
+    return targets
+
+
+EPOCH = datetime(1970, 1, 1)
 
 
 def bucket_time(ts, size):
-    return ts.replace(
-        minute=(ts.minute // size) * size,
-        second=0,
-        microsecond=0
-    )
+    # floored from the epoch, not within the hour, so consecutive buckets are
+    # exactly `size` minutes apart even when size doesn't divide 60
+    width = size * 60
+    return EPOCH + timedelta(seconds=int((ts - EPOCH).total_seconds()) // width * width)
 
 
 def safe_filename(s):
@@ -56,188 +187,1132 @@ def safe_filename(s):
 
 # ================= SCENARIO OBSERVER =================
 
+# Installed once per context; observers start at document creation so
+# nothing is missed, and read() drains pending records before returning.
+VITALS_INIT_SCRIPT = """
+(() => {
+  if (window !== window.top || window.__vitals) return
+  const v = { fcp: -1, lcp: -1, cls: 0, inp: -1 }
+  const observers = []
+  const observe = (type, cb, opts = {}) => {
+    try {
+      const o = new PerformanceObserver(l => cb(l.getEntries()))
+      o.observe({ type, buffered: true, ...opts })
+      observers.push([o, cb])
+    } catch (e) {}
+  }
+
+  observe('paint', es => {
+    for (const e of es) if (e.name === 'first-contentful-paint') v.fcp = e.startTime
+  })
+  observe('largest-contentful-paint', es => {
+    if (es.length) v.lcp = es[es.length - 1].startTime
+  })
+
+  // CLS = largest session window (1s gap, 5s cap), same as web-vitals
+  let win = 0, first = 0, last = 0
+  observe('layout-shift', es => {
+    for (const e of es) {
+      if (e.hadRecentInput) continue
+      if (win && e.startTime - last < 1000 && e.startTime - first < 5000) {
+        win += e.value
+      } else {
+        win = e.value
+        first = e.startTime
+      }
+      last = e.startTime
+      v.cls = Math.max(v.cls, win)
+    }
+  })
+
+  observe('event', es => {
+    for (const e of es) if (e.interactionId) v.inp = Math.max(v.inp, e.duration)
+  }, { durationThreshold: 40 })
+
+  window.__vitals = {
+    read(withResources) {
+      for (const [o, cb] of observers) {
+        const r = o.takeRecords()
+        if (r.length) cb(r)
+      }
+      const resources = withResources
+        ? performance.getEntriesByType('resource').map(e => [
+            e.name, e.initiatorType, e.duration, e.transferSize, e.encodedBodySize])
+        : undefined
+      const n = performance.getEntriesByType('navigation')[0]
+      if (!n) return { ...v, ttfb: -1, resources }
+      return {
+        ...v,
+        resources,
+        ttfb: n.responseStart,
+        dns: n.domainLookupEnd - n.domainLookupStart,
+        connect: n.connectEnd - n.connectStart,
+        tls: n.secureConnectionStart > 0 ? n.connectEnd - n.secureConnectionStart : 0,
+        dcl: n.domContentLoadedEventEnd,
+        load_event: n.loadEventEnd,
+        transfer_bytes: n.transferSize,
+      }
+    }
+  }
+})()
+"""
+
+VITALS = ("fcp", "lcp", "cls", "inp", "ttfb", "dns", "connect", "tls", "dcl", "load_event", "transfer_bytes")
+
+EMPTY_VITALS = {k: -1 for k in VITALS} | {"cls": 0.0}
+
+
 class ScenarioObserver:
     def __init__(self):
         self.start = None
 
+    @staticmethod
+    def install(ctx):
+        ctx.add_init_script(VITALS_INIT_SCRIPT)
+
     def begin(self):
         self.start = time.time()
 
-    def end(self, page):
+    def end(self, page, resources=False):
+        """Timing dict; with `resources` it also carries the page's resource-timing entries."""
         if not self.start:
             return None
 
         duration = int((time.time() - self.start) * 1000)
 
-        fcp = page.evaluate("""
-            () => performance.getEntriesByName('first-contentful-paint')[0]?.startTime || -1
-        """)
-
-        lcp = page.evaluate("""
-            () => new Promise(resolve => {
-              new PerformanceObserver(list => {
-                const e = list.getEntries()
-                resolve(e[e.length - 1]?.startTime || -1)
-              }).observe({ type: 'largest-contentful-paint', buffered: true })
-            })
-        """)
-
-        cls = page.evaluate("""
-            () => {
-              let v = 0
-              new PerformanceObserver(list => {
-                for (const e of list.getEntries()) {
-                  if (!e.hadRecentInput) v += e.value
-                }
-              }).observe({ type: 'layout-shift', buffered: true })
-              return v
-            }
-        """)
+        # one roundtrip for everything the init script buffered
+        v = page.evaluate("r => window.__vitals ? window.__vitals.read(r) : null", resources) or {}
 
         self.start = None
-        return duration, fcp, lcp, cls
+        timing = {"duration": duration} | EMPTY_VITALS | {k: v[k] for k in VITALS if v.get(k) is not None}
+        if resources:
+            timing["resources"] = v.get("resources") or []
+        return timing
 
 
-# ================= MAIN =================
+# ================= NETWORK CAPTURE =================
 
-def main():
-    args = parse_args()
+# per-sample summary columns; empty in the raw results when capture is off
+NETWORK_FIELDS = (
+    "requests", "failed_requests", "cache_hits",
+    "resource_bytes", "slowest_resource_ms", "slowest_resource",
+)
+# a sample that never reached the browser: nothing was captured
+EMPTY_NETWORK = {
+    "requests": 0, "failed_requests": 0, "cache_hits": 0,
+    "resource_bytes": 0, "slowest_resource_ms": -1, "slowest_resource": "", "network": [],
+}
 
-    RUN_ID = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}_{uuid.uuid4().hex[:6]}"
-    BASE = os.path.join("runs", args.env, RUN_ID)
-    SHOTS = os.path.join(BASE, "screenshots")
 
-    os.makedirs(SHOTS, exist_ok=True)
+def _span(t, a, b):
+    return round(t[b] - t[a], 1) if t.get(a, -1) >= 0 and t.get(b, -1) >= 0 else -1
 
-    RAW = os.path.join(BASE, "results.csv")
-    ERR = os.path.join(BASE, "errors.csv")
-    SUM = os.path.join(BASE, "summary_report.csv")
-    BUCKET = os.path.join(BASE, "bucketed_performance_report.csv")
-    PROM = os.path.join(BASE, "prometheus_metrics.txt")
 
-    urls = load_urls(args.urls)
-    end = time.time() + args.duration * 60
+class NetworkCapture:
+    """
+    Per-request timings for one page from Playwright's response /
+    requestfinished / requestfailed events. Those carry no byte counts, and
+    memory-cache hits never reach the network layer, so finish() folds in
+    the page's resource-timing entries for transfer size and cache hits.
+    """
 
-    timings = defaultdict(list)
-    bucketed = defaultdict(lambda: defaultdict(list))
-    bucketed_lcp = defaultdict(lambda: defaultdict(list))
+    def __init__(self, page):
+        self.entries = []
+        self.status = {}
+        page.on("response", self._response)
+        page.on("requestfinished", lambda req: self._add(req))
+        page.on("requestfailed", lambda req: self._add(req, req.failure or "failed"))
 
-    observer = ScenarioObserver()
+    def _response(self, resp):
+        self.status[resp.request] = (resp.status, resp.from_service_worker)
 
-    with open(RAW, "w", newline="") as rf, open(ERR, "w", newline="") as ef:
-        rw, ew = csv.writer(rf), csv.writer(ef)
+    def _add(self, req, failure=""):
+        t = req.timing
+        status, from_sw = self.status.pop(req, (0, False))
+        self.entries.append({
+            "url": req.url, "type": req.resource_type, "method": req.method,
+            "status": status, "failure": failure,
+            "started": t.get("startTime", -1),
+            "dns": _span(t, "domainLookupStart", "domainLookupEnd"),
+            "connect": _span(t, "connectStart", "connectEnd"),
+            "tls": _span(t, "secureConnectionStart", "connectEnd"),
+            "ttfb": _span(t, "requestStart", "responseStart"),
+            "duration": round(t.get("responseEnd", -1), 1),
+            "bytes": -1, "cache_hit": from_sw,
+        })
 
-        rw.writerow([
-            "timestamp_utc", "env", "run_id", "url", "status",
-            "duration_ms", "fcp_ms", "lcp_ms", "cls",
-            "error_type", "error_message", "screenshot"
-        ])
+    def finish(self, resources):
+        """(entries, summary fields) once the sample is measured."""
+        by_name = defaultdict(list)
+        for r in resources:
+            by_name[r[0]].append(r)
 
-        ew.writerow([
-            "timestamp_utc", "env", "run_id", "url",
-            "error_type", "error_message", "screenshot"
-        ])
+        entries = self.entries
+        for e in entries:
+            rt = by_name.get(e["url"])
+            if rt:
+                _, _, _, transfer, encoded = rt.pop(0)
+                if transfer or encoded:
+                    e["bytes"] = transfer
+                    e["cache_hit"] = e["cache_hit"] or (transfer == 0 and encoded > 0)
 
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            ctx = browser.new_context()
-
-            while time.time() < end:
-                for url in urls:
-                    if time.time() >= end:
-                        break
-
-                    page = ctx.new_page()
-                    now = datetime.utcnow()
-
-                    status = "SUCCESS"
-                    err_t = err_m = shot = ""
-                    duration = fcp = lcp = -1
-                    cls = 0.0
-
-                    try:
-                        observer.begin()
-                        page.goto(url, timeout=60000, wait_until="load")
-                        duration, fcp, lcp, cls = observer.end(page)
-
-                    except PlaywrightTimeoutError as e:
-                        status, err_t, err_m = "FAILURE", "TIMEOUT", str(e)
-
-                    except Exception as e:
-                        status, err_t, err_m = "FAILURE", "ERROR", str(e)
-
-                    if status != "SUCCESS":
-                        shot = os.path.join(
-                            SHOTS,
-                            f"{now.strftime('%H%M%S')}_{safe_filename(url)}_{err_t}.png"
-                        )
-                        try:
-                            page.screenshot(path=shot, full_page=True)
-                        except:
-                            shot = ""
-
-                        ew.writerow([now.isoformat(), args.env, RUN_ID, url, err_t, err_m, shot])
-
-                    rw.writerow([
-                        now.isoformat(), args.env, RUN_ID, url, status,
-                        duration, int(fcp), int(lcp), round(cls, 3),
-                        err_t, err_m, shot
-                    ])
-
-                    if status == "SUCCESS" and duration > 0:
-                        timings[url].append(duration)
-                        b = bucket_time(now, args.bucket)
-                        bucketed[url][b].append(duration)
-                        if lcp > 0:
-                            bucketed_lcp[url][b].append(lcp)
-
-                    page.close()
-                    time.sleep(args.delay)
+        # served from memory cache: in resource timing but no network event
+        for name, left in by_name.items():
+            for _, kind, duration, transfer, encoded in left:
+                if transfer == 0 and encoded > 0:
+                    entries.append({
+                        "url": name, "type": kind, "method": "GET", "status": 0, "failure": "",
+                        "started": -1, "dns": -1, "connect": -1, "tls": -1, "ttfb": -1,
+                        "duration": round(duration, 1), "bytes": 0, "cache_hit": True,
+                    })
 
-            browser.close()
+        slowest = max(entries, key=lambda e: e["duration"], default=None)
+        return entries, {
+            "requests": len(entries),
+            "failed_requests": sum(1 for e in entries if e["failure"] or e["status"] >= 400),
+            "cache_hits": sum(1 for e in entries if e["cache_hit"]),
+            "resource_bytes": sum(e["bytes"] for e in entries if e["bytes"] > 0),
+            "slowest_resource_ms": int(slowest["duration"]) if slowest else -1,
+            "slowest_resource": slowest["url"] if slowest else "",
+        }
 
-    # ===== SUMMARY =====
-    with open(SUM, "w", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(["url", "avg_ms", "p90_ms", "max", "min", "samples"])
-        for u, t in timings.items():
-            w.writerow([
-                u,
-                int(statistics.mean(t)),
-                int(percentile(t, 90)),
-                max(t), min(t), len(t)
+
+def write_har(path, s):
+    """A HAR 1.2 file for one sample, from NetworkCapture entries."""
+    def iso(ms):
+        return datetime.utcfromtimestamp(ms / 1000).isoformat() + "Z" if ms > 0 else s["ts"].isoformat() + "Z"
+
+    entries = []
+    for e in s["network"]:
+        wait = max(e["ttfb"], 0)
+        entries.append({
+            "pageref": "page_1",
+            "startedDateTime": iso(e["started"]),
+            "time": max(e["duration"], 0),
+            "request": {"method": e["method"], "url": e["url"], "httpVersion": "",
+                        "headers": [], "queryString": [], "cookies": [],
+                        "headersSize": -1, "bodySize": -1},
+            "response": {"status": e["status"], "statusText": e["failure"], "httpVersion": "",
+                         "headers": [], "cookies": [], "redirectURL": "",
+                         "content": {"size": e["bytes"], "mimeType": ""},
+                         "headersSize": -1, "bodySize": e["bytes"]},
+            "cache": {},
+            "timings": {
+                "blocked": -1, "dns": e["dns"], "connect": e["connect"], "ssl": e["tls"],
+                "send": 0, "wait": wait,
+                "receive": max(e["duration"] - wait - max(e["connect"], 0) - max(e["dns"], 0), 0),
+            },
+            "_resourceType": e["type"],
+            "_fromCache": e["cache_hit"],
+        })
+
+    har = {"log": {
+        "version": "1.2",
+        "creator": {"name": "synthetic_monitor", "version": "1"},
+        "pages": [{
+            "id": "page_1", "title": s["url"], "startedDateTime": s["ts"].isoformat() + "Z",
+            "pageTimings": {"onContentLoad": s["dcl"], "onLoad": s["duration"]},
+        }],
+        "entries": entries,
+    }}
+    with open(path, "w") as f:
+        json.dump(har, f)
+
+
+# ================= SCHEDULER =================
+
+class Scheduler:
+    """
+    Fixed-rate schedule shared by all workers. Each URL is due every
+    `interval` seconds measured from its previous *due* time, not from when
+    the last probe finished, so probe latency never stretches the period.
+    Slots missed while every worker was busy are skipped, not replayed.
+
+    scale() changes one URL's rate at runtime (adaptive sampling); the
+    interval never drops below `min_interval`. An `elastic` schedule (agent
+    mode) can be re-targeted with set_targets() and idles while empty.
+    """
+
+    def __init__(self, targets, end, min_interval=5, elastic=False):
+        self.end = end
+        self.min_interval = min_interval
+        self.elastic = elastic
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.heap = []
+        self.base = {}
+        self.intervals = {}
+        self.set_targets(targets)
+
+    def set_targets(self, targets):
+        """Replace the target list; URLs that stay keep their slot and rate."""
+        with self.lock:
+            keep = {url for url, _ in targets}
+            self.heap = [e for e in self.heap if e[2] in keep]
+            scheduled = {e[2] for e in self.heap}
+
+            now = time.time()
+            n = max(len(targets), 1)
+            for i, (url, interval) in enumerate(targets):
+                if url in scheduled:
+                    continue
+                self.base[url] = self.intervals[url] = interval
+                # stagger first runs so N urls don't all fire in the same second
+                self.heap.append((now + interval * i / n, i, url, interval))
+            heapq.heapify(self.heap)
+
+    def scale(self, url, rate):
+        """Sample `url` `rate` times as often as configured (0.5 = half as often)."""
+        with self.lock:
+            if url not in self.base:
+                return
+            interval = max(self.base[url] / rate, self.min_interval)
+            self.intervals[url] = interval
+            # pull a far-off next slot forward so a speed-up applies right away
+            now = time.time()
+            self.heap = [
+                (min(due, now + interval) if u == url else due, i, u, iv)
+                for due, i, u, iv in self.heap
+            ]
+            heapq.heapify(self.heap)
+
+    def next(self):
+        while True:
+            with self.lock:
+                if self.heap:
+                    due, i, url, _ = heapq.heappop(self.heap)
+                    interval = self.intervals[url]
+
+                    nxt = due + interval
+                    now = time.time()
+                    if nxt <= now:
+                        nxt += math.ceil((now - nxt) / interval + 1e-9) * interval
+                    heapq.heappush(self.heap, (nxt, i, url, interval))
+                    break
+            if not self.elastic or self.stop.wait(1) or time.time() >= self.end:
+                return None
+
+        if due >= self.end or self.stop.wait(max(0.0, due - time.time())):
+            return None
+        return url
+
+
+# ================= PROBE =================
+
+classify = failures.classify
+
+CIRCUIT_OPEN = "CIRCUIT_OPEN"
+
+
+def screenshot(page, shots, now, name, err_t):
+    """Queue a capped viewport JPEG of a failed page; "" when the caps skip it."""
+    return shots.capture(page, f"{now.strftime('%H%M%S')}_{safe_filename(name)}_{err_t}", target=name)
+
+
+def probe(ctx, url, observer, shots, pool=None, network=False, timeout=60000, js_errors=False):
+    page = ctx.new_page()
+    now = datetime.utcnow()
+
+    status = "SUCCESS"
+    err_t = err_m = shot = ""
+    timing = {"duration": -1} | EMPTY_VITALS
+    capture = NetworkCapture(page) if network else None
+    thrown = []
+    if js_errors:
+        page.on("pageerror", thrown.append)
+
+    try:
+        observer.begin()
+        response = page.goto(url, timeout=timeout, wait_until="load")
+        if response and response.status >= 400:
+            raise failures.HttpError(response.status, url)
+        measured = observer.end(page, resources=network)
+        if thrown:
+            raise failures.JsError(f"{len(thrown)} uncaught: {thrown[0]}")
+        timing = measured
+
+    except Exception as e:
+        status, (err_t, err_m) = "FAILURE", classify(e)
+        shot = screenshot(page, shots, now, url, err_t)
+
+    if capture:
+        network, summary = capture.finish(timing.pop("resources", []))
+        timing |= summary | {"network": network}
+
+    if pool:
+        pool.check_heap(page)
+    page.close()
+
+    return {
+        "ts": now, "url": url, "status": status,
+        "error_type": err_t, "error_message": err_m, "screenshot": shot,
+    } | timing
+
+
+def sample(pool, url, observer, shots, network=False, timeout=60000, js_errors=False):
+    """One scheduled visit of `url`; paired mode yields a cold and a warm probe."""
+    opts = {"network": network, "timeout": timeout, "js_errors": js_errors}
+    with pool.lease() as ctx:
+        if pool.mode != "paired":
+            # a new (or just recycled) shared context has nothing cached yet
+            cache = "cold" if pool.fresh else pool.mode
+            return [probe(ctx, url, observer, shots, pool, **opts) | {"cache": cache}]
+
+        cold = probe(ctx, url, observer, shots, **opts) | {"cache": "cold"}
+        warm = probe(ctx, url, observer, shots, **opts) | {"cache": "warm"}
+        return [cold, warm]
+
+
+def failed_visit(args, pool, target, err_t, err_m, start=None):
+    """
+    FAILURE samples standing in for a visit that produced none of its own,
+    with the same fields a real sample of this run would carry.
+    """
+    caches = ["cold", "warm"] if pool.mode == "paired" else [pool.mode]
+    base = {
+        "ts": datetime.utcnow(), "url": target, "status": "FAILURE",
+        "error_type": err_t, "error_message": err_m, "screenshot": "",
+        "duration": -1,
+    } | EMPTY_VITALS
+    if args.mode == "scenario":
+        base |= {"url": f"{target}/total", "journey": target, "step": "total"}
+    elif args.network:
+        base |= EMPTY_NETWORK
+    if args.host:
+        base["host_saturated"] = args.host.saturated_since(time.time() if start is None else start)
+    return [base | {"cache": c} for c in caches]
+
+
+def fast_fail(args, pool, target, reason, start=None):
+    """Samples for a visit skipped because the target's circuit breaker is open."""
+    return failed_visit(args, pool, target, CIRCUIT_OPEN, reason, start)
+
+
+# ================= JOURNEYS =================
+
+class StepObserver:
+    """
+    The `step` handed to a journey: `with step("checkout"): ...` times the
+    block as one sample labelled `<journey>/<step>`. Vitals belong to a
+    document, so they are only reported for steps that navigated the main
+    frame; in-page steps (clicks, SPA updates) carry duration only.
+    """
+
+    def __init__(self, page, journey, cache, shots):
+        self.page, self.journey, self.cache, self.shots = page, journey, cache, shots
+        self.observer = ScenarioObserver()
+        self.samples = []
+        self.navigations = 0
+        page.on("framenavigated", self._navigated)
+
+    def _navigated(self, frame):
+        if frame == self.page.main_frame:
+            self.navigations += 1
+
+    def _sample(self, step, now, **fields):
+        return {
+            "ts": now, "url": f"{self.journey}/{step}", "status": "SUCCESS",
+            "error_type": "", "error_message": "", "screenshot": "",
+            "cache": self.cache, "journey": self.journey, "step": step,
+        } | fields
+
+    @contextmanager
+    def __call__(self, step):
+        now = datetime.utcnow()
+        before = self.navigations
+        self.observer.begin()
+        try:
+            yield self.page
+        except Exception as e:
+            err_t, err_m = classify(e)
+            shot = screenshot(self.page, self.shots, now, f"{self.journey}_{step}", err_t)
+            self.samples.append(self._sample(
+                step, now, status="FAILURE", error_type=err_t, error_message=err_m,
+                screenshot=shot, duration=-1, **EMPTY_VITALS
+            ))
+            raise
+
+        if self.navigations > before:
+            timing = self.observer.end(self.page)
+        else:
+            timing = {"duration": int((time.time() - self.observer.start) * 1000)} | EMPTY_VITALS
+            self.observer.start = None
+        self.samples.append(self._sample(step, now, **timing))
+
+
+def run_journey(ctx, name, shots, cache, pool=None, timeout=60000):
+    """
+    One pass of a registered journey in a fresh page: a sample per step,
+    then a `<journey>/total` sample. A failing step ends the journey.
+    """
+    journey = scenario_registry.get(name)
+    page = ctx.new_page()
+    page.set_default_navigation_timeout(timeout)
+    step = StepObserver(page, name, cache, shots)
+
+    now = datetime.utcnow()
+    start = time.time()
+    try:
+        journey(page, step)
+    except Exception as e:
+        if not step.samples or step.samples[-1]["status"] == "SUCCESS":
+            # failed outside any step block
+            err_t, err_m = classify(e)
+            step.samples.append(step._sample(
+                "unstepped", now, status="FAILURE", error_type=err_t, error_message=err_m,
+                screenshot=screenshot(page, shots, now, name, err_t), duration=-1, **EMPTY_VITALS
+            ))
+
+    failed = [s for s in step.samples if s["status"] != "SUCCESS"]
+    total = step._sample("total", now, duration=int((time.time() - start) * 1000), **EMPTY_VITALS)
+    if failed:
+        total |= {"status": "FAILURE", "duration": -1,
+                  "error_type": failed[0]["error_type"],
+                  "error_message": f"step {failed[0]['step']}: {failed[0]['error_message']}"}
+
+    if pool:
+        pool.check_heap(page)
+    page.close()
+    return step.samples + [total]
+
+
+def sample_journey(pool, name, shots, timeout=60000):
+    """One scheduled run of journey `name`; paired mode runs it cold then warm."""
+    with pool.lease() as ctx:
+        if pool.mode != "paired":
+            return run_journey(ctx, name, shots, "cold" if pool.fresh else pool.mode, pool, timeout)
+        return (run_journey(ctx, name, shots, "cold", timeout=timeout)
+                + run_journey(ctx, name, shots, "warm", timeout=timeout))
+
+
+def make_pool(args, browser):
+    return ContextPool(
+        browser,
+        mode=args.context_mode,
+        spares=args.context_spares,
+        max_uses=args.context_max_uses,
+        max_heap_mb=args.context_max_heap_mb,
+        setup=ScenarioObserver.install,
+        **({"storage_state": args.storage_state} if args.storage_state else {}),
+    )
+
+
+def load_session(args):
+    """Saved storage_state for --session-user; every context the pools create starts logged in."""
+    if not args.session_user:
+        return None
+    state = session_store.SessionStore(args.session_dir).get(args.session_user)
+    if state is None:
+        raise SystemExit(f"no valid saved session for {args.session_user}; "
+                         f"log in once (e.g. reset_sftoken.py) to refresh it")
+    return state
+
+
+# ================= RECORDER =================
+
+METRICS = ("duration", "fcp", "lcp", "cls", "inp", "ttfb")
+
+RAW_HEADER = [
+    "timestamp_utc", "env", "run_id", "url", "status",
+    "duration_ms", "fcp_ms", "lcp_ms", "cls",
+    "error_type", "error_message", "screenshot",
+    "inp_ms", "ttfb_ms", "dns_ms", "connect_ms", "tls_ms",
+    "dcl_ms", "load_event_ms", "transfer_bytes", "cache",
+    "journey", "step",
+    *NETWORK_FIELDS, "host_saturated"
+]
+
+# column types for the parquet/arrow sinks, so a batch of failures
+# (blank network/host columns) can't fix the wrong types for the file
+RAW_SCHEMA = dict.fromkeys(RAW_HEADER, "string") | {
+    "duration_ms": "int64", "fcp_ms": "int64", "lcp_ms": "int64", "cls": "double",
+    "inp_ms": "int64", "ttfb_ms": "int64", "dns_ms": "int64", "connect_ms": "int64",
+    "tls_ms": "int64", "dcl_ms": "int64", "load_event_ms": "int64", "transfer_bytes": "int64",
+    "requests": "int64", "failed_requests": "int64", "cache_hits": "int64",
+    "resource_bytes": "int64", "slowest_resource_ms": "int64", "host_saturated": "int8",
+}
+
+ERR_HEADER = [
+    "timestamp_utc", "env", "run_id", "url",
+    "error_type", "error_message", "screenshot"
+]
+
+SUM_HEADER = [
+    "url", "avg_ms", "p90_ms", "max", "min", "samples",
+    "p50_ms", "p95_ms", "p99_ms", "cache",
+    "journey", "step"
+]
+
+BUCKET_HEADER = [
+    "bucket_start_utc", "env", "run_id", "url",
+    "p90_load_ms", "avg_load_ms",
+    "p90_lcp_ms", "avg_lcp_ms", "samples",
+    "p50_load_ms", "p95_load_ms", "p99_load_ms",
+    "p50_lcp_ms", "p95_lcp_ms", "p99_lcp_ms", "cache",
+    "journey", "step",
+    "host_cpu_max", "probe_cpu_max", "browser_cpu_max",
+    "probe_rss_mb_max", "browser_rss_mb_max", "saturated_readings", "saturated_samples"
+]
+
+
+RESOURCE_HEADER = [
+    "bucket_start_utc", "env", "run_id", "url", "cache", "rank",
+    "resource", "type", "status", "duration_ms", "ttfb_ms",
+    "dns_ms", "connect_ms", "tls_ms", "bytes", "cache_hit", "sample_utc"
+]
+
+# a sample's HAR is only written once its url has this many samples,
+# so the first few loads don't all count as slow
+HAR_MIN_SAMPLES = 20
+HAR_MAX_FILES = 1000
+
+
+def write_atomic(path, write):
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class Recorder:
+    """
+    Writes raw/error rows and keeps the aggregates. Safe to share across workers.
+
+    A bucket is finalized once its window plus `grace` seconds has passed:
+    its row is appended to the bucket report and the summary / Prometheus
+    files are rewritten atomically, so a crash loses at most the open buckets.
+    """
+
+    def __init__(self, base, env, run_id, bucket, grace, metrics=None, sink="csv",
+                 top_resources=0, har_percentile=0, drop_saturated=False, **sink_opts):
+        self.env, self.run_id, self.bucket = env, run_id, bucket
+        self.metrics = metrics
+        self.slo = None
+        self.drop_saturated = drop_saturated
+        self.top_resources = top_resources
+        self.har_percentile = har_percentile
+        self.har_dir = os.path.join(base, "har")
+        self.hars = 0
+        self.grace = timedelta(seconds=grace)
+        self.lock = threading.Lock()
+
+        self.SUM = os.path.join(base, "summary_report.csv")
+        self.PROM = os.path.join(base, "prometheus_metrics.txt")
+
+        if issubclass(SINKS[sink], ArrowSink):
+            sink_opts["schema"] = RAW_SCHEMA
+        self.raw = open_sink(sink, os.path.join(base, "results.csv"), RAW_HEADER, **sink_opts)
+        self.ef = open(os.path.join(base, "errors.csv"), "w", newline="")
+        self.bf = open(os.path.join(base, "bucketed_performance_report.csv"), "w", newline="")
+        self.ew, self.bw = csv.writer(self.ef), csv.writer(self.bf)
+
+        self.ew.writerow(ERR_HEADER)
+        self.bw.writerow(BUCKET_HEADER)
+
+        # (url, cache, bucket) -> resource url -> its slowest load in the bucket
+        self.resources = defaultdict(dict)
+        self.resf = self.resw = None
+        if top_resources:
+            self.resf = open(os.path.join(base, "resources_report.csv"), "w", newline="")
+            self.resw = csv.writer(self.resf)
+            self.resw.writerow(RESOURCE_HEADER)
+        if har_percentile:
+            os.makedirs(self.har_dir, exist_ok=True)
+
+        # bucket -> host telemetry maxima, written beside that bucket's rows
+        self.host = defaultdict(lambda: defaultdict(float))
+        self.telemetry_path = os.path.join(base, "telemetry.csv")
+        self.tf = self.tw = None
+        self.dropped = 0
+
+        # (url, cache) -> metric -> sketch for the whole run,
+        # (url, cache, bucket) -> metric -> sketch for open buckets only
+        self.overall = defaultdict(lambda: defaultdict(QuantileSketch))
+        self.buckets = defaultdict(lambda: defaultdict(QuantileSketch))
+        # samples older than this belong to a bucket that is already written
+        self.closed_until = datetime.min
+        self.late = 0
+        # scenario samples: "<journey>/<step>" -> (journey, step) for the report columns
+        self.steps = {}
+
+        self.stop = threading.Event()
+        self.ticker = threading.Thread(target=self._tick, name="bucket-flush", daemon=True)
+        self.ticker.start()
+
+    def record_host(self, r):
+        """
+        HostMonitor reading: one telemetry row, and the maxima of its bucket.
+        Agents' readings carry their `agent` name; the bucket keeps the busiest.
+        """
+        ts = datetime.utcfromtimestamp(r["ts"])
+        with self.lock:
+            if self.tw is None:
+                self.tf = open(self.telemetry_path, "w", newline="")
+                self.tw = csv.writer(self.tf)
+                self.tw.writerow([*resource_monitor.TELEMETRY_HEADER, "agent"])
+            self.tw.writerow([ts.isoformat(), *(r[k] for k in resource_monitor.TELEMETRY_HEADER[1:-1]),
+                              int(r["saturated"]), r.get("agent", "")])
+            h = self.host[bucket_time(ts, self.bucket)]
+            for k in ("host_cpu", "probe_cpu", "browser_cpu", "probe_rss_mb", "browser_rss_mb"):
+                h[k] = max(h[k], r[k])
+            h["saturated_readings"] += r["saturated"]
+
+    def record(self, s):
+        now, url = s["ts"], s["url"]
+        key = (url, s["cache"])
+        har = None
+        saturated = s.get("host_saturated")
+        # a saturated host measures itself, not the site
+        skip = saturated and self.drop_saturated
+
+        if self.metrics and not skip:
+            self.metrics.observe(s)
+        if self.slo and not skip:
+            self.slo.observe(s)
+
+        with self.lock:
+            if s["status"] != "SUCCESS":
+                self.ew.writerow([
+                    now.isoformat(), self.env, self.run_id, url,
+                    s["error_type"], s["error_message"], s["screenshot"]
+                ])
+
+            self.raw.write([
+                now.isoformat(), self.env, self.run_id, url, s["status"],
+                s["duration"], int(s["fcp"]), int(s["lcp"]), round(s["cls"], 3),
+                s["error_type"], s["error_message"], s["screenshot"],
+                *(int(s[k]) for k in VITALS[3:]), s["cache"],
+                s.get("journey", ""), s.get("step", ""),
+                *(s.get(k, "") for k in NETWORK_FIELDS),
+                "" if saturated is None else int(saturated)
             ])
+            if saturated:
+                self.host[bucket_time(now, self.bucket)]["saturated_samples"] += 1
+            if skip:
+                self.dropped += 1
+                return
+            if s.get("journey"):
+                self.steps[url] = (s["journey"], s["step"])
 
-    # ===== BUCKET =====
-    with open(BUCKET, "w", newline="") as f:
-        w = csv.writer(f)
-        w.writerow([
-            "bucket_start_utc", "env", "run_id", "url",
-            "p90_load_ms", "avg_load_ms",
-            "p90_lcp_ms", "avg_lcp_ms", "samples"
-        ])
+            if s["status"] == "SUCCESS" and s["duration"] > 0:
+                b = bucket_time(now, self.bucket)
+                if b < self.closed_until:
+                    self.late += 1
+                for m in METRICS:
+                    # vitals are -1 when the browser never reported them
+                    if m == "cls" or s[m] > 0:
+                        self.overall[key][m].add(s[m])
+                        if b >= self.closed_until:
+                            self.buckets[(*key, b)][m].add(s[m])
+
+                if "network" in s:
+                    if self.top_resources and b >= self.closed_until:
+                        self._keep_slowest(self.resources[(*key, b)], s)
+                    har = self._har_path(key, s)
+
+        if har:
+            write_har(har, s)
+
+    def _keep_slowest(self, worst, s):
+        for e in s["network"]:
+            seen = worst.get(e["url"])
+            if seen is None or e["duration"] > seen["duration"]:
+                worst[e["url"]] = e | {"sample_utc": s["ts"].isoformat()}
+
+    def _har_path(self, key, s):
+        if not self.har_percentile or self.hars >= HAR_MAX_FILES:
+            return None
+        sk = self.overall[key]["duration"]
+        if sk.count < HAR_MIN_SAMPLES or s["duration"] < sk.quantile(self.har_percentile):
+            return None
+        self.hars += 1
+        return os.path.join(
+            self.har_dir,
+            f"{s['ts'].strftime('%H%M%S')}_{safe_filename(s['url'])}_{s['cache']}_{s['duration']}ms.har"
+        )
 
-        for u in bucketed:
-            for b in bucketed[u]:
-                lt = bucketed[u][b]
-                lc = bucketed_lcp[u].get(b, [])
-                w.writerow([
-                    b.isoformat(), args.env, RUN_ID, u,
-                    int(percentile(lt, 90)),
-                    int(statistics.mean(lt)),
-                    int(percentile(lc, 90)) if lc else -1,
-                    int(statistics.mean(lc)) if lc else -1,
-                    len(lt)
+    def _tick(self):
+        while not self.stop.wait(5):
+            self.flush()
+
+    def flush(self, final=False):
+        with self.lock:
+            width = timedelta(minutes=self.bucket)
+            cutoff = datetime.utcnow() - width - self.grace
+            done = sorted(k for k in self.buckets if final or k[-1] <= cutoff)
+            if not done and not final:
+                return
+
+            for u, cache, b in done:
+                m = self.buckets.pop((u, cache, b))
+                lt, lc = m["duration"], m["lcp"]
+                self.bw.writerow([
+                    b.isoformat(), self.env, self.run_id, u,
+                    int(lt.quantile(90)), int(lt.mean()),
+                    int(lc.quantile(90)), int(lc.mean()),
+                    lt.count,
+                    int(lt.quantile(50)), int(lt.quantile(95)), int(lt.quantile(99)),
+                    int(lc.quantile(50)), int(lc.quantile(95)), int(lc.quantile(99)),
+                    cache, *self.steps.get(u, ("", "")), *self._host_columns(b)
                 ])
+                self._write_resources(u, cache, b, self.resources.pop((u, cache, b), {}))
+                self.closed_until = max(self.closed_until, b + width)
+
+            for b in [b for b in self.host if final or b + width <= self.closed_until]:
+                del self.host[b]
+
+            self.raw.flush()
+            for f in (self.ef, self.bf, self.resf, self.tf):
+                if f:
+                    f.flush()
+
+            write_atomic(self.SUM, self._write_summary)
+            write_atomic(self.PROM, self._write_prom)
+
+    def _host_columns(self, b):
+        h = self.host.get(b)
+        if not h:
+            return [""] * 7
+        return [
+            round(h["host_cpu"]), round(h["probe_cpu"]), round(h["browser_cpu"]),
+            round(h["probe_rss_mb"]), round(h["browser_rss_mb"]),
+            int(h["saturated_readings"]), int(h["saturated_samples"]),
+        ]
+
+    def _write_resources(self, u, cache, b, worst):
+        if not self.resw:
+            return
+        top = sorted(worst.values(), key=lambda e: -e["duration"])[:self.top_resources]
+        for rank, e in enumerate(top, 1):
+            self.resw.writerow([
+                b.isoformat(), self.env, self.run_id, u, cache, rank,
+                e["url"], e["type"], e["status"] or e["failure"], int(e["duration"]), int(e["ttfb"]),
+                int(e["dns"]), int(e["connect"]), int(e["tls"]), e["bytes"], int(e["cache_hit"]),
+                e["sample_utc"]
+            ])
+
+    def _write_summary(self, f):
+        w = csv.writer(f)
+        w.writerow(SUM_HEADER)
+        for (u, cache), m in self.overall.items():
+            t = m["duration"]
+            w.writerow([
+                u,
+                int(t.mean()),
+                int(t.quantile(90)),
+                int(t.max), int(t.min), t.count,
+                int(t.quantile(50)), int(t.quantile(95)), int(t.quantile(99)),
+                cache, *self.steps.get(u, ("", ""))
+            ])
 
-    # ===== PROM =====
-    with open(PROM, "w") as f:
-        for u, t in timings.items():
+    def _write_prom(self, f):
+        for (u, cache), m in self.overall.items():
             f.write(
-                f'web_page_load_p90_ms{{env="{args.env}",url="{u}",run_id="{RUN_ID}"}} '
-                f'{int(percentile(t, 90))}\n'
+                f'web_page_load_p90_ms{{env="{self.env}",url="{u}",run_id="{self.run_id}",cache="{cache}"}} '
+                f'{int(m["duration"].quantile(90))}\n'
             )
 
+    def close(self):
+        self.stop.set()
+        self.ticker.join()
+        self.flush(final=True)
+        if self.late:
+            print(f"[recorder] {self.late} late samples counted in summary only")
+        if self.dropped:
+            print(f"[recorder] {self.dropped} samples taken on a saturated host left out of the aggregates")
+        if self.hars:
+            print(f"[recorder] {self.hars} HAR files for samples >= p{self.har_percentile:g} in {self.har_dir}")
+        self.raw.close()
+        for f in (self.ef, self.bf, self.resf, self.tf):
+            if f:
+                f.close()
+
+
+# ================= RUN MODES =================
+
+def visitor(args, pool, shots):
+    """
+    target -> samples for the chosen --mode, flagged if the host was
+    saturated meanwhile. While a target's breaker is open its visits fail
+    fast as CIRCUIT_OPEN samples without touching the browser.
+    """
+    timeout = int(args.timeout * 1000)
+    if args.mode == "scenario":
+        run = lambda name: sample_journey(pool, name, shots, timeout)
+    else:
+        observer = ScenarioObserver()
+        run = lambda url: sample(pool, url, observer, shots, args.network, timeout, args.fail_on_js_error)
+
+    def visit(target):
+        start = time.time()
+        if args.breakers:
+            reason = args.breakers.allow(target)
+            if reason:
+                return fast_fail(args, pool, target, reason, start)
+
+        ok = False
+        try:
+            samples = run(target)
+            ok = all(s["status"] == "SUCCESS" for s in samples)
+        finally:
+            # always settle the breaker: a half-open probe that raised would
+            # otherwise keep the target fast-failing for the rest of the run
+            if args.breakers:
+                args.breakers.record(target, ok)
+        if args.host:
+            saturated = args.host.saturated_since(start)
+            for s in samples:
+                s["host_saturated"] = saturated
+        return samples
+    return visit
+
+
+class GuardedVisitor:
+    """
+    visitor() over this thread's own browser. A visit that raises is logged
+    and recorded as failure samples instead of ending the loop, and a browser
+    that went away with it is relaunched.
+    """
+
+    def __init__(self, args, playwright, shots):
+        self.args, self.playwright, self.shots = args, playwright, shots
+        self._launch()
+
+    def _launch(self):
+        self.browser = self.playwright.chromium.launch(headless=True)
+        self.pool = make_pool(self.args, self.browser)
+        self.visit = visitor(self.args, self.pool, self.shots)
+
+    def __call__(self, target):
+        start = time.time()
+        try:
+            return self.visit(target)
+        except Exception as e:
+            err_t, err_m = classify(e)
+            print(f"[{threading.current_thread().name}] {target}: {err_t}: {err_m}", flush=True)
+            samples = failed_visit(self.args, self.pool, target, err_t, f"worker: {err_m}", start)
+            if not self.browser.is_connected():
+                self._launch()
+            return samples
+
+    def close(self):
+        self.pool.close()
+        self.browser.close()
+
+
+def run_serial(args, targets, end, recorder, shots):
+    with sync_playwright() as p:
+        visit = GuardedVisitor(args, p, shots)
+
+        while time.time() < end:
+            for target in targets:
+                if time.time() >= end:
+                    break
+
+                samples = visit(target)
+                for s in samples:
+                    recorder.record(s)
+                if samples[0]["error_type"] != CIRCUIT_OPEN:
+                    time.sleep(args.delay)
+
+        visit.close()
+
+
+def worker(args, scheduler, recorder, shots):
+    # sync Playwright is per-thread, so every worker owns its own driver + browser
+    with sync_playwright() as p:
+        visit = GuardedVisitor(args, p, shots)
+
+        while True:
+            url = scheduler.next()
+            if url is None:
+                break
+            for s in visit(url):
+                recorder.record(s)
+
+        visit.close()
+
+
+def run_workers(args, end, recorder, shots):
+    # in scenario mode the schedule's targets are journey names; concurrent
+    # journeys each run in their own worker's browser
+    scheduler = Scheduler(load_targets(target_file(args), args.interval), end, args.min_interval)
+    if recorder.slo and args.adaptive:
+        recorder.slo.on_rate = scheduler.scale
+    run_threads(args, scheduler, recorder, shots, args.workers)
+
+
+def run_threads(args, scheduler, recorder, shots, n):
+    threads = [
+        threading.Thread(target=worker, args=(args, scheduler, recorder, shots), name=f"probe-{i}")
+        for i in range(n)
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(1)
+    except KeyboardInterrupt:
+        scheduler.stop.set()
+        for t in threads:
+            t.join()
+
+
+# options that change how a sample is taken; the coordinator's values
+# override each agent's own CLI, so every agent probes the same way
+PROBE_OPTIONS = (
+    "network", "timeout", "fail_on_js_error",
+    "context_mode", "context_max_uses", "context_max_heap_mb", "context_spares",
+    "session_user", "min_interval",
+    "breaker_failures", "breaker_cooldown", "breaker_max_cooldown",
+    "shots_per_min", "shot_every", "shot_max_kb", "shot_quality",
+    "telemetry_secs", "saturation_cpu", "saturation_mem",
+)
+
+
+def run_coordinator(args, end, recorder, run_id):
+    coordinator = distributed.Coordinator(
+        args.listen, load_targets(target_file(args), args.interval),
+        recorder, run_id, args.mode, end,
+        options={k: getattr(args, k) for k in PROBE_OPTIONS},
+    )
+    if recorder.slo and args.adaptive:
+        recorder.slo.on_rate = coordinator.rate
+    coordinator.run()
+
+
+def run_agent(args):
+    """Probe whatever shard the coordinator assigns until it says stop."""
+    link = distributed.AgentLink(args.coordinator, args.workers, args.agent_name or None)
+    first = link.wait_assignment()
+    if first is None:
+        return
+
+    args.mode = first["mode"]
+    for k, v in first.get("options", {}).items():
+        if getattr(args, k, v) != v:
+            print(f"[agent {link.name}] {k} = {v!r} (coordinator) instead of {getattr(args, k)!r}")
+        setattr(args, k, v)
+    # the session user comes from the coordinator; the session itself from this host's store
+    args.storage_state = load_session(args)
+    if args.mode == "scenario":
+        for name, _ in first["targets"]:
+            scenario_registry.get(name)
+    end = time.time() + first["remaining"]
+    shots = make_failure_handling(args, os.path.join("runs", args.env, first["run_id"], "screenshots"))
+
+    scheduler = Scheduler(first["targets"], end, args.min_interval, elastic=True)
+    link.on_assign = lambda a: scheduler.set_targets(a["targets"])
+    link.on_rate = scheduler.scale
+    link.on_stop = scheduler.stop.set
+    link.start()
+
+    print(f"[agent {link.name}] run {first['run_id']}: {len(first['targets'])} targets")
+    # saturation is judged where the browsers run; the flag travels with each
+    # sample and every reading goes to the coordinator's telemetry / bucket report
+    args.host = resource_monitor.start(args.telemetry_secs, args.saturation_cpu, args.saturation_mem,
+                                       link.record_host)
+    try:
+        run_threads(args, scheduler, link, shots, max(args.workers, 1))
+    finally:
+        link.close()
+        shots.close()
+        if args.host:
+            args.host.close()
+
+
+def make_slo_monitor(args, base, run_id):
+    defaults = {
+        "p90_ms": args.slo_p90_ms,
+        "lcp_p90_ms": args.slo_lcp_p90_ms,
+        "error_rate": args.slo_error_rate,
+    }
+    slos = slo.load_slos(args.slo, defaults)
+    if not slos and not any(defaults.values()) and not args.adaptive:
+        return None
+    events = slo.EventSink(os.path.join(base, "slo_events.jsonl"), args.alert_webhook or None)
+    return slo.SloMonitor(args.env, run_id, slos, defaults, events,
+                          window=args.slo_window or args.bucket * 60)
+
+
+def make_failure_handling(args, shots_dir):
+    """Sets args.breakers and returns the ScreenshotWriter for `shots_dir`."""
+    os.makedirs(shots_dir, exist_ok=True)
+    args.breakers = None
+    if args.breaker_failures:
+        args.breakers = failures.CircuitBreakers(
+            args.breaker_failures, args.breaker_cooldown, args.breaker_max_cooldown
+        )
+    return failures.ScreenshotWriter(
+        shots_dir, per_minute=args.shots_per_min, per_target_secs=args.shot_every,
+        max_kb=args.shot_max_kb, quality=args.shot_quality,
+    )
+
+
+def target_file(args):
+    return args.scenarios if args.mode == "scenario" else args.urls
+
+
+# ================= MAIN =================
+
+def main():
+    args = parse_args()
+    if args.role == "agent":
+        run_agent(args)
+        return
+
+    args.storage_state = load_session(args)
+    if args.mode == "scenario":
+        for name, _ in load_targets(args.scenarios, args.interval):
+            scenario_registry.get(name)    # unknown names fail before the run starts
+
+    STARTED = datetime.utcnow()
+    RUN_ID = f"{STARTED.strftime('%Y%m%dT%H%M%SZ')}_{uuid.uuid4().hex[:6]}"
+    BASE = os.path.join("runs", args.env, RUN_ID)
+    SHOTS = make_failure_handling(args, os.path.join(BASE, "screenshots"))
+
+    end = time.time() + args.duration * 60
+
+    metrics = server = None
+    if args.metrics_port:
+        metrics = prom_exporter.ProbeMetrics(args.env, RUN_ID)
+        server = prom_exporter.serve(metrics, args.metrics_port)
+        print(f"[metrics] serving http://0.0.0.0:{args.metrics_port}/metrics")
+
+    recorder = Recorder(
+        BASE, args.env, RUN_ID, args.bucket, args.grace, metrics,
+        sink=args.sink, flush_rows=args.sink_rows, flush_secs=args.sink_secs,
+        top_resources=args.network_top if args.network else 0,
+        har_percentile=args.har_percentile if args.network else 0,
+        drop_saturated=args.saturated == "drop",
+    )
+    recorder.slo = make_slo_monitor(args, BASE, RUN_ID)
+    # a coordinator runs no browsers: its host columns come from the agents' readings
+    args.host = None if args.role == "coordinator" else resource_monitor.start(
+        args.telemetry_secs, args.saturation_cpu, args.saturation_mem, recorder.record_host
+    )
+    try:
+        if args.role == "coordinator":
+            run_coordinator(args, end, recorder, RUN_ID)
+        elif args.workers > 0:
+            run_workers(args, end, recorder, SHOTS)
+        else:
+            targets = [t for t, _ in load_targets(target_file(args), args.interval)]
+            run_serial(args, targets, end, recorder, SHOTS)
+    finally:
+        SHOTS.close()
+        if args.host:
+            args.host.close()
+        recorder.close()
+        if recorder.slo:
+            recorder.slo.close()
+        if args.history_db:
+            history.add_run(args.history_db, RUN_ID, args.env, STARTED, recorder.overall)
+        if server:
+            server.shutdown()
+
 
 if __name__ == "__main__":
     main()
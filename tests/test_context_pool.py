@@ -0,0 +1,37 @@
+from context_pool import ContextPool
+
+
+class Context:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Browser:
+    def __init__(self):
+        self.contexts = []
+
+    def new_context(self, **opts):
+        self.contexts.append(Context())
+        return self.contexts[-1]
+
+
+def test_warm_context_is_fresh_only_on_its_first_lease():
+    pool = ContextPool(Browser(), mode="warm", max_uses=2)
+    fresh = []
+    for _ in range(5):
+        with pool.lease():
+            fresh.append(pool.fresh)
+    assert fresh == [True, False, True, False, True]
+    assert pool.recycled == 2
+
+
+def test_warm_context_is_never_recycled_by_default():
+    browser = Browser()
+    pool = ContextPool(browser, mode="warm")
+    for _ in range(200):
+        with pool.lease():
+            pass
+    assert len(browser.contexts) == 1 and pool.recycled == 0
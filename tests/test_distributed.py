@@ -0,0 +1,82 @@
+import time
+import threading
+
+import pytest
+
+import distributed
+from distributed import AgentLink, Coordinator
+
+
+class FakeRecorder:
+    def __init__(self):
+        self.samples, self.host = [], []
+
+    def record(self, s):
+        self.samples.append(s)
+
+    def record_host(self, r):
+        self.host.append(r)
+
+
+def wait_for(cond, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if cond():
+            return
+        time.sleep(0.02)
+    raise AssertionError("condition not met")
+
+
+@pytest.fixture
+def coordinator(monkeypatch):
+    monkeypatch.setenv(distributed.AUTHKEY_ENV, "test-secret")
+    targets = [(f"https://site/{i}", 60) for i in range(5)]
+    coord = Coordinator("127.0.0.1:0", targets, FakeRecorder(), "run1", "url", time.time() + 3,
+                        options={"network": True})
+    thread = threading.Thread(target=coord.run, kwargs={"drain": 10}, daemon=True)
+    thread.start()
+    coord.addr = "127.0.0.1:%d" % coord.listener.address[1]
+    coord.thread = thread
+    yield coord
+    coord.listener.close()
+
+
+def connect(coord, name):
+    link = AgentLink(coord.addr, 1, name)
+    first = link.wait_assignment()
+    link.assigned, link.stopped = [first], threading.Event()
+    link.on_assign = link.assigned.append
+    link.on_stop = link.stopped.set
+    link.start()
+    return link
+
+
+def test_shards_rebalance_and_stop_drains(coordinator):
+    targets = coordinator.targets
+    a1 = connect(coordinator, "a1")
+    assert a1.assigned[0]["targets"] == targets
+    assert a1.assigned[0]["options"] == {"network": True}
+
+    # a second agent splits the targets round-robin
+    a2 = connect(coordinator, "a2")
+    assert a2.assigned[0]["targets"] == targets[1::2]
+    wait_for(lambda: a1.assigned[-1]["targets"] == targets[0::2])
+
+    a2.record({"url": targets[1][0]})
+    a2.record_host({"ts": time.time(), "host_cpu": 50})
+    a2.close()
+
+    # ... and the survivor takes them all back when it leaves
+    wait_for(lambda: a1.assigned[-1]["targets"] == targets)
+    assert list(coordinator.agents) == ["a1"]
+
+    a1.record({"url": targets[0][0]})
+    assert a1.stopped.wait(5)               # the run ended: coordinator says stop
+    a1.close()                              # in-flight samples go out before bye
+
+    coordinator.thread.join(5)
+    assert not coordinator.thread.is_alive()    # drained on bye, not on the deadline
+    rec = coordinator.recorder
+    assert sorted(s["url"] for s in rec.samples) == [targets[0][0], targets[1][0]]
+    assert coordinator.samples == 2
+    assert [r["agent"] for r in rec.host] == ["a2"]
@@ -0,0 +1,179 @@
+import os
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("playwright")
+
+import failures
+
+
+def test_classify():
+    assert failures.classify(Exception("net::ERR_NAME_NOT_RESOLVED at https://x"))[0] == "DNS"
+    assert failures.classify(Exception("net::ERR_CERT_DATE_INVALID"))[0] == "TLS"
+    assert failures.classify(Exception("net::ERR_ABORTED"))[0] == "ABORTED"
+    assert failures.classify(failures.HttpError(503, "https://x"))[0] == "HTTP_503"
+    assert failures.classify(failures.JsError("boom"))[0] == "JS_ERROR"
+    assert failures.classify(Exception("something else"))[0] == "ERROR"
+
+
+def test_breaker_opens_half_opens_and_closes():
+    b = failures.CircuitBreakers(threshold=2, cooldown=0.1, max_cooldown=1)
+    b.record("u", False)
+    assert b.allow("u") is None
+    b.record("u", False)
+    assert b.allow("u")                   # open: fail fast
+
+    time.sleep(0.15)
+    assert b.allow("u") is None           # half-open: one visit through
+    assert b.allow("u")                   # ... and only one
+    b.record("u", True)
+    assert b.allow("u") is None
+
+
+def test_failed_half_open_probe_doubles_cooldown():
+    b = failures.CircuitBreakers(threshold=1, cooldown=0.1, max_cooldown=1)
+    b.record("u", False)
+    time.sleep(0.15)
+    assert b.allow("u") is None
+    b.record("u", False)
+    assert b.breakers["u"].cooldown == pytest.approx(0.2)
+    assert b.allow("u")
+
+
+class Page:
+    def __init__(self, size=100, fail=False):
+        self.size, self.fail = size, fail
+
+    def screenshot(self, **kw):
+        assert kw["type"] == "jpeg" and not kw["full_page"]
+        if self.fail:
+            raise RuntimeError("page crashed")
+        return b"x" * (self.size if kw["quality"] > 30 else 10)
+
+
+def test_screenshot_caps_and_counts(tmp_path):
+    w = failures.ScreenshotWriter(str(tmp_path), per_minute=100, per_target_secs=0, max_kb=1)
+    paths = [w.capture(Page(), f"s{i}") for i in range(3)]
+    assert w.capture(Page(size=5000), "big") == str(tmp_path / "big.jpg")     # retaken at quality 30
+    assert w.capture(Page(fail=True), "crashed") == ""
+
+    threads = [threading.Thread(target=lambda: [w.capture(Page(), "same", target="t") for _ in range(50)])
+               for _ in range(4)]
+    w.per_target_secs = 3600
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    w.close()
+
+    assert all(paths)
+    assert w.failed == 1
+    assert w.skipped == 199               # one of the 200 "t" shots gets through
+    assert sorted(os.listdir(tmp_path)) == ["big.jpg", "s0.jpg", "s1.jpg", "s2.jpg", "same.jpg"]
+
+
+def test_visit_that_raises_still_settles_the_breaker(monkeypatch):
+    pytest.importorskip("pandas")
+    import argparse
+    import synthetic_monitor
+
+    def crash(*a, **kw):
+        raise RuntimeError("browser has been closed")
+
+    monkeypatch.setattr(synthetic_monitor, "sample", crash)
+    args = argparse.Namespace(mode="url", timeout=1, network=False, fail_on_js_error=False, host=None,
+                              breakers=failures.CircuitBreakers(threshold=1, cooldown=0.05, max_cooldown=0.05))
+    visit = synthetic_monitor.visitor(args, pool=argparse.Namespace(mode="warm"), shots=None)
+
+    with pytest.raises(RuntimeError):
+        visit("https://x")
+    assert visit("https://x")[0]["error_type"] == synthetic_monitor.CIRCUIT_OPEN
+
+    # the half-open probe raises too; the breaker must not stay stuck half-open
+    time.sleep(0.06)
+    with pytest.raises(RuntimeError):
+        visit("https://x")
+    time.sleep(0.06)
+    with pytest.raises(RuntimeError):
+        visit("https://x")
+
+
+class Host:
+    def __init__(self, saturated):
+        self.saturated = saturated
+
+    def saturated_since(self, start):
+        return self.saturated
+
+
+def test_fast_fail_rows_fit_a_parquet_run(tmp_path):
+    pytest.importorskip("pandas")
+    pq = pytest.importorskip("pyarrow.parquet")
+    import argparse
+    from datetime import datetime
+    import synthetic_monitor
+
+    args = argparse.Namespace(mode="url", network=True, host=Host(True))
+    pool = argparse.Namespace(mode="warm")
+    ok = {
+        "ts": datetime.utcnow(), "url": "https://x", "status": "SUCCESS", "cache": "warm",
+        "error_type": "", "error_message": "", "screenshot": "", "duration": 800,
+        "requests": 12, "failed_requests": 0, "cache_hits": 3, "resource_bytes": 4096,
+        "slowest_resource_ms": 120, "slowest_resource": "https://x/app.js", "network": [],
+        "host_saturated": False,
+    } | synthetic_monitor.EMPTY_VITALS
+    opened = synthetic_monitor.fast_fail(args, pool, "https://x", "open for 30s")[0]
+    assert set(ok) <= set(opened)
+
+    recorder = synthetic_monitor.Recorder(str(tmp_path), "test", "run", 5, 90, sink="parquet", flush_rows=1)
+    recorder.record(opened)             # the first batch no longer fixes the column types
+    recorder.record(ok)
+    recorder.close()
+
+    table = pq.read_table(tmp_path / "results.parquet")
+    assert table.column("requests").to_pylist() == [0, 12]
+    assert table.column("host_saturated").to_pylist() == [1, 0]
+    assert table.column("error_type").to_pylist() == [synthetic_monitor.CIRCUIT_OPEN, ""]
+
+
+def test_guarded_visitor_survives_a_raising_visit_and_relaunches(monkeypatch):
+    pytest.importorskip("pandas")
+    import argparse
+    import synthetic_monitor
+
+    browsers = []
+
+    class Browser:
+        def __init__(self):
+            self.connected = True
+            browsers.append(self)
+
+        def is_connected(self):
+            return self.connected
+
+        def close(self):
+            pass
+
+    playwright = argparse.Namespace(chromium=argparse.Namespace(launch=lambda **kw: Browser()))
+    pool = argparse.Namespace(mode="warm", close=lambda: None)
+    monkeypatch.setattr(synthetic_monitor, "make_pool", lambda args, browser: pool)
+
+    def visitor(args, pool, shots):
+        def visit(url):
+            if url == "crash":
+                browsers[-1].connected = False
+                raise RuntimeError("Target page, context or browser has been closed")
+            return [{"url": url, "status": "SUCCESS"}]
+        return visit
+
+    monkeypatch.setattr(synthetic_monitor, "visitor", visitor)
+    args = argparse.Namespace(mode="url", network=False, host=None)
+    visit = synthetic_monitor.GuardedVisitor(args, playwright, shots=None)
+
+    failed = visit("crash")
+    assert failed[0]["status"] == "FAILURE" and failed[0]["error_message"].startswith("worker: ")
+    assert len(browsers) == 2
+    assert visit("https://x") == [{"url": "https://x", "status": "SUCCESS"}]
+    visit.close()
@@ -0,0 +1,167 @@
+import json
+import time
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+import mailbox_watcher
+from mailbox_watcher import MailboxWatcher, MailTimeout
+
+
+class MockMailsac:
+    """The two Mailsac endpoints the watcher uses, over a local HTTP server."""
+
+    def __init__(self):
+        self.messages = {}        # email -> [message dicts], newest first
+        self.bodies = {}          # id -> text
+        self.body_fetches = Counter()
+        self.fail_bodies = Counter()   # id -> how many more body fetches answer 503
+        self.lock = threading.Lock()
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                with mock.lock:
+                    if parts[:2] == ["api", "addresses"]:
+                        self._send(json.dumps(mock.messages.get(parts[2], [])), "application/json")
+                    elif parts[:2] == ["api", "text"]:
+                        mock.body_fetches[parts[3]] += 1
+                        if mock.fail_bodies[parts[3]] > 0:
+                            mock.fail_bodies[parts[3]] -= 1
+                            self.send_error(503)
+                        else:
+                            self._send(mock.bodies[parts[3]], "text/plain")
+                    else:
+                        self.send_error(404)
+
+            def _send(self, text, ctype):
+                data = text.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def deliver(self, email, message_id, body, **fields):
+        with self.lock:
+            self.messages.setdefault(email, []).insert(0, {"_id": message_id, **fields})
+            self.bodies[message_id] = body
+
+    def close(self):
+        self.server.shutdown()
+
+
+@pytest.fixture
+def mailsac():
+    mock = MockMailsac()
+    yield mock
+    mock.close()
+
+
+@pytest.fixture
+def watcher(mailsac):
+    w = MailboxWatcher({}, base_url=mailsac.url, poll_min=0.05, poll_max=0.2, max_rps=0)
+    yield w
+    w.close()
+
+
+def wait_first_poll(watcher, email, timeout=5):
+    """A new wait only looks at the latest message on its first poll; deliver after it."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with watcher.lock:
+            inbox = watcher.inboxes.get(email)
+            if inbox and all(w.checked is not None for w in inbox.waiters):
+                return
+        time.sleep(0.01)
+    raise AssertionError("watcher never polled")
+
+
+def test_concurrent_waits_fetch_each_body_once(mailsac, watcher):
+    email = "shared@mailsac.com"
+    users = [f"user{i}" for i in range(22)]
+    futures = [watcher.watch(email, lambda m, b, u=u: f"for {u}:" in b, timeout=10) for u in users]
+    wait_first_poll(watcher, email)
+
+    for i, u in enumerate(users):
+        mailsac.deliver(email, f"m{i}", f"verification code for {u}: {1000 + i}")
+
+    assert [f.result(10) for f in futures] == [f"verification code for {u}: {1000 + i}"
+                                               for i, u in enumerate(users)]
+    assert set(mailsac.body_fetches.values()) == {1}
+
+
+def test_timeout(mailsac, watcher):
+    with pytest.raises(MailTimeout):
+        watcher.wait("empty@mailsac.com", lambda m, b: True, timeout=0.3)
+
+
+def test_malformed_messages_do_not_stop_the_watcher(mailsac, watcher):
+    email = "odd@mailsac.com"
+    with mailsac.lock:
+        mailsac.messages[email] = [{"subject": "no id"}, "not even a dict"]
+    future = watcher.watch(email, lambda m, b: "code" in b, timeout=10)
+
+    mailsac.deliver(email, "good", "your code is 42")
+    assert future.result(10) == "your code is 42"
+    assert watcher.thread.is_alive()
+
+
+@pytest.mark.parametrize("already_there", [True, False])
+def test_failed_body_fetch_is_retried(mailsac, watcher, already_there):
+    email = "flaky@mailsac.com"
+    mailsac.fail_bodies["otp"] = 1
+    if already_there:
+        mailsac.deliver(email, "otp", "your code is 123456")
+    future = watcher.watch(email, lambda m, b: "code" in b, timeout=10)
+    if not already_there:
+        wait_first_poll(watcher, email)
+        mailsac.deliver(email, "otp", "your code is 123456")
+
+    assert future.result(10) == "your code is 123456"
+    assert mailsac.body_fetches["otp"] == 2
+
+
+def test_ignore_skips_messages_already_in_the_inbox(mailsac, watcher):
+    email = "token@mailsac.com"
+    mailsac.deliver(email, "old", "your security token is OLD")
+    seen = watcher.message_ids(email)
+    future = watcher.watch(email, lambda m, b: "token" in b, timeout=10, ignore=seen)
+
+    time.sleep(0.2)
+    assert not future.done()
+    mailsac.deliver(email, "new", "your security token is NEW")
+    assert future.result(10) == "your security token is NEW"
+    assert "old" not in mailsac.body_fetches
+
+
+def test_pending_waits_fail_if_the_thread_dies(mailsac, watcher, monkeypatch):
+    def boom(now):
+        raise KeyError("bookkeeping bug")
+
+    monkeypatch.setattr(watcher, "_expire", boom)
+    future = watcher.watch("x@mailsac.com", lambda m, b: True, timeout=60)
+    with pytest.raises(RuntimeError, match="watcher stopped"):
+        future.result(5)
+
+
+def test_body_cache_is_bounded(mailsac, watcher, monkeypatch):
+    monkeypatch.setattr(mailbox_watcher, "BODY_CACHE", 5)
+    email = "busy@mailsac.com"
+    for i in range(20):
+        mailsac.deliver(email, f"b{i}", f"body {i}")
+        watcher.message_text(email, f"b{i}")
+    assert list(watcher.bodies) == [f"b{i}" for i in range(15, 20)]
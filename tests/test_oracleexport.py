@@ -0,0 +1,76 @@
+import os
+import csv
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+pytest.importorskip("oracledb")
+pytest.importorskip("pandas")
+
+import oracleexport
+
+
+class SqlitePool:
+    """Stand-in for an oracledb pool: acquire() gives a fresh sqlite3 connection."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def acquire(self):
+        return closing(sqlite3.connect(self.path, check_same_thread=False))
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "src.db")
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.executemany("INSERT INTO t VALUES (?, ?)", [(i, f"row{i}") for i in range(1, 1001)])
+        conn.commit()
+    return path
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_stream_against_standin_cursor(db, tmp_path):
+    out = str(tmp_path / "out.csv")
+    with closing(sqlite3.connect(db)) as conn:
+        cursor = conn.cursor()
+        batches = oracleexport.fetch_batches(cursor, "SELECT id, name FROM t ORDER BY id")
+        oracleexport.write_csv_stream(cursor, batches, out, oracleexport.Progress())
+
+    rows = read_csv(out)
+    assert rows[0] == ["id", "name"]
+    assert len(rows) == 1001
+
+
+def test_parallel_range_export_merges_parts(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(oracleexport, "MERGE_PARTITIONS", True)
+    out = str(tmp_path / "out.csv")
+    pool = SqlitePool(db)
+    with pool.acquire() as conn:
+        parts = oracleexport.range_partitions("SELECT id, name FROM t", "id", 4, conn)
+
+    oracleexport.parallel_export(pool, parts, out, workers=4)
+
+    rows = read_csv(out)
+    assert rows[0] == ["id", "name"]
+    assert sorted(int(r[0]) for r in rows[1:]) == list(range(1, 1001))
+    assert sorted(os.listdir(tmp_path)) == ["out.csv", "src.db"]
+
+
+def test_parallel_export_removes_parts_on_failure(db, tmp_path):
+    out = str(tmp_path / "out.csv")
+    parts = [
+        ("SELECT id, name FROM t WHERE id <= :hi", {"hi": 500}),
+        ("SELECT id, name FROM missing_table", {}),
+    ]
+
+    with pytest.raises(sqlite3.OperationalError):
+        oracleexport.parallel_export(SqlitePool(db), parts, out, workers=2)
+
+    assert sorted(os.listdir(tmp_path)) == ["src.db"]
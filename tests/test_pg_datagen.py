@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+import pg_datagen
+from pg_datagen import Choice, Const, Gen, Seq, Token, Zipf
+
+
+def test_gen_is_abstract():
+    with pytest.raises(TypeError):
+        Gen()
+
+
+def test_copy_special_characters_are_escaped():
+    spec = {"table": "t", "columns": {"a": Choice(["x\ty", "a\\N", "two\nlines"]), "b": Const("c\rd")}}
+    for line in pg_datagen.chunk_text(spec, 0, 50, seed=1):
+        assert line.endswith("\n") and line.count("\n") == 1
+        assert line.count("\t") == 1
+        assert line.split("\t")[0] in ("x\\ty", "a\\\\N", "two\\nlines")
+        assert line.rstrip("\n").split("\t")[1] == "c\\rd"
+
+
+def test_zipf_maps_ranks_onto_every_id():
+    # 7919 was the fixed stride; a multiple of it used to collapse every rank onto one id
+    z = Zipf(7919 * 3, s=0.0)
+    ids = {(r * z.stride) % z.cardinality for r in range(z.cardinality)}
+    assert len(ids) == z.cardinality
+    assert len(set(z.values(0, 2000, random.Random(1)))) > 1
+
+    with pytest.raises(ValueError):
+        Zipf(0)
+
+
+def test_short_tokens_are_not_unique():
+    assert Token(32).unique and not Token(8).unique
+    with pytest.raises(ValueError, match="length"):
+        pg_datagen.check_spec({"table": "t", "columns": {"k": Token(8)}, "unique": ["k"]})
+
+
+def pg_dsn():
+    try:
+        with psycopg.connect(pg_datagen.PG_DSN, connect_timeout=3):
+            return pg_datagen.PG_DSN
+    except psycopg.OperationalError:
+        pytest.skip("no Postgres at PG_DSN")
+
+
+@pytest.fixture
+def pg(tmp_path, monkeypatch):
+    dsn = pg_dsn()
+    monkeypatch.chdir(tmp_path)             # <table>.indexes.sql lands here
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        conn.execute("DROP TABLE IF EXISTS datagen_child, datagen_smoke")
+        conn.execute("CREATE TABLE datagen_smoke (id bigint PRIMARY KEY, tok text UNIQUE, kind text)")
+        conn.execute("CREATE INDEX datagen_smoke_kind ON datagen_smoke (kind)")
+        yield dsn, conn
+        conn.execute("DROP TABLE IF EXISTS datagen_child, datagen_smoke")
+
+
+SMOKE = {
+    "table": "datagen_smoke",
+    "columns": {"id": Seq(1), "tok": Token(20, salt="smoke"), "kind": Choice(["a\tb", "c"])},
+    "unique": ["id", "tok"],
+}
+
+
+def test_load_and_rebuild_indexes(pg):
+    dsn, conn = pg
+    pg_datagen.check_spec(SMOKE)
+
+    saved = pg_datagen.drop_indexes(dsn, "datagen_smoke")
+    assert len(saved) == 3
+    pg_datagen.parallel_load(dsn, SMOKE, 1000, workers=2, chunk_rows=300)
+    pg_datagen.rebuild_indexes(dsn, "datagen_smoke", saved)
+
+    assert conn.execute("SELECT count(*), count(DISTINCT tok) FROM datagen_smoke").fetchone() == (1000, 1000)
+    assert conn.execute("SELECT count(*) FROM pg_indexes WHERE tablename = 'datagen_smoke'").fetchone()[0] == 3
+    assert {k for (k,) in conn.execute("SELECT DISTINCT kind FROM datagen_smoke")} == {"a\tb", "c"}
+
+
+def test_drop_refuses_when_referenced_by_foreign_keys(pg):
+    dsn, conn = pg
+    conn.execute("CREATE TABLE datagen_child (smoke_id bigint REFERENCES datagen_smoke (id))")
+
+    with pytest.raises(SystemExit, match="datagen_child"):
+        pg_datagen.drop_indexes(dsn, "datagen_smoke")
+    assert conn.execute("SELECT count(*) FROM pg_indexes WHERE tablename = 'datagen_smoke'").fetchone()[0] == 3
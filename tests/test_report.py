@@ -0,0 +1,26 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+import report
+
+
+def test_mixed_run_keeps_metrics_of_files_without_status(tmp_path):
+    old = tmp_path / "ui" / "results.csv"
+    new = tmp_path / "sm" / "results.csv"
+    old.parent.mkdir()
+    new.parent.mkdir()
+    old.write_text("timestamp_utc,url,page_load_time_ms\n"
+                   "2024-05-01T10:00:00,u0,900\n"
+                   "2024-05-01T10:00:05,u0,-1\n")
+    new.write_text("timestamp_utc,env,run_id,url,status,duration_ms,lcp_ms\n"
+                   "2024-05-01T10:00:00,staging,r1,u1,SUCCESS,700,500\n"
+                   "2024-05-01T10:00:05,staging,r1,u1,FAILURE,-1,-1\n")
+
+    df = report.load_results([str(old), str(new)], ["duration_ms", "lcp_ms"], ["url"])
+    out = report.aggregate(df, ["url"], ["duration_ms", "lcp_ms"], [50]).set_index("url")
+
+    assert out.loc["u0", "count_duration_ms"] == 1
+    assert out.loc["u0", "mean_duration_ms"] == 900
+    assert out.loc["u1", "count_duration_ms"] == 1
+    assert out.loc["u1", "count_lcp_ms"] == 1
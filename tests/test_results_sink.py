@@ -0,0 +1,40 @@
+import csv
+
+import pytest
+
+from results_sink import open_sink
+
+
+def test_csv_sink_flushes_every_n_rows(tmp_path):
+    sink = open_sink("csv", str(tmp_path / "r.csv"), ["a", "b"], flush_rows=2)
+    sink.write([1, "x"])
+    sink.write([2, ""])
+    with open(tmp_path / "r.csv", newline="") as f:
+        assert list(csv.reader(f)) == [["a", "b"], ["1", "x"], ["2", ""]]
+    sink.close()
+
+
+@pytest.mark.parametrize("kind", ["parquet", "arrow"])
+def test_arrow_sinks_write_blanks_as_null(tmp_path, kind):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    import pyarrow.ipc as ipc
+
+    schema = {"n": "int64", "s": "string"}
+    with open_sink(kind, str(tmp_path / "r.csv"), ["n", "s"], schema=schema, flush_rows=1) as sink:
+        sink.write(["", ""])
+        sink.write([7, "x"])
+
+    path = str(tmp_path / f"r.{kind}")
+    table = pq.read_table(path) if kind == "parquet" else ipc.open_file(pa.memory_map(path)).read_all()
+    assert table.schema.field("n").type == pa.int64()
+    assert table.column("n").to_pylist() == [None, 7]
+    assert table.column("s").to_pylist() == ["", "x"]
+
+
+def test_inferred_schema_treats_blank_as_missing(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    with open_sink("parquet", str(tmp_path / "r.csv"), ["n", "s"]) as sink:
+        sink.write([1, ""])
+        sink.write(["", "y"])
+    assert pq.read_table(tmp_path / "r.parquet").to_pydict() == {"n": [1, None], "s": ["", "y"]}
@@ -0,0 +1,74 @@
+import csv
+from datetime import datetime
+
+import pytest
+
+import watermark
+
+
+def export(tmp_path, name, batches, state=None):
+    path, state_path = str(tmp_path / name), str(tmp_path / "state.json")
+    with watermark.CheckpointedCsv(path, ["id", "v"], state_path, "ID", None, state) as out:
+        for rows in batches:
+            out.write(rows, [rows[-1][0]])
+    return path, state_path
+
+
+def read_rows(path):
+    with watermark.open_output(path) as f:
+        return list(csv.reader(f))
+
+
+@pytest.mark.parametrize("name", ["out.csv", "out.csv.gz", "out.csv.zst"])
+def test_batches_read_back_as_one_stream(tmp_path, name):
+    if name.endswith(".zst"):
+        pytest.importorskip("zstandard")
+    path, _ = export(tmp_path, name, [[[1, "a"], [2, "b"]], [[3, "c"]]])
+    assert read_rows(path) == [["id", "v"], ["1", "a"], ["2", "b"], ["3", "c"]]
+
+
+def test_resume_discards_bytes_after_checkpoint(tmp_path):
+    path, state_path = export(tmp_path, "out.csv", [[[1, "a"]]])
+    with open(path, "a") as f:
+        f.write("2,half-written")
+
+    export(tmp_path, "out.csv", [[[2, "b"]]], watermark.load_state(state_path))
+    assert read_rows(path) == [["id", "v"], ["1", "a"], ["2", "b"]]
+    assert watermark.load_state(state_path)["rows"] == 2
+
+
+def test_missing_output_with_checkpoint_is_an_error(tmp_path):
+    path, state_path = export(tmp_path, "out.csv", [[[1, "a"]]])
+    (tmp_path / "out.csv").unlink()
+
+    with pytest.raises(SystemExit):
+        export(tmp_path, "out.csv", [[[2, "b"]]], watermark.load_state(state_path))
+    assert not (tmp_path / "out.csv").exists()
+
+
+def test_timestamp_marks_keep_full_precision():
+    state = {"mark": ["2024-05-01 10:00:00.123456789", 7]}
+    sql, params = watermark.incremental_query("SELECT * FROM t", "TS", "ID", state, timestamp=True)
+
+    assert f"TO_CHAR(q.TS, '{watermark.TS_FORMAT}') {watermark.MARK_ALIAS}" in sql
+    assert "q.TS > TO_TIMESTAMP(:wm" in sql
+    assert params == {"wm": "2024-05-01 10:00:00.123456789", "wm_tb": 7}
+
+    description = [("ID",), ("TS",), (watermark.MARK_ALIAS,)]
+    assert watermark.mark_columns(description, "TS", "ID") == [2, 0]
+    assert watermark.data_width(description) == 2
+
+
+def test_old_datetime_mark_is_converted_for_timestamp_columns():
+    state = {"mark": [watermark.encode(datetime(2024, 5, 1, 10, 0, 0, 5)), 7]}
+    _, params = watermark.incremental_query("SELECT * FROM t", "TS", "ID", state, timestamp=True)
+    assert params["wm"] == "2024-05-01 10:00:00.000005"
+
+
+def test_rows_with_a_null_mark_are_not_exported():
+    sql, params = watermark.incremental_query("SELECT * FROM t", "UPDATED", "ID")
+    assert "WHERE q.UPDATED IS NOT NULL ORDER BY q.UPDATED, q.ID" in sql
+    assert params == {}
+
+    with pytest.raises(SystemExit, match="NULL"):
+        watermark.incremental_query("SELECT * FROM t", "UPDATED", "ID", {"mark": [None, 7]})
@@ -0,0 +1,218 @@
+import io
+import os
+import csv
+import gzip
+import json
+from datetime import date, datetime
+
+
+# ================= INCREMENTAL EXTRACTS =================
+#
+# A run keeps a high-water mark (the last exported value of an ordered
+# column, plus an optional unique tiebreak column) in a small JSON state
+# file. The next run only selects rows past that mark and appends them to
+# the same output.
+#
+# Every batch is appended and fsynced before the state file is replaced,
+# and the state also records the output's byte size at that point. If a
+# run dies between the two steps, the next run truncates the output back
+# to the checkpoint, so no batch is lost or written twice.
+#
+# Oracle TIMESTAMP marks are carried as TO_CHAR(..., FF9) strings in an
+# extra MARK_ALIAS column: Python datetimes stop at microseconds, and a
+# truncated mark would re-export rows at the boundary.
+
+MARK_ALIAS = "WM_MARK_TS__"
+TS_FORMAT = "YYYY-MM-DD HH24:MI:SS.FF9"
+
+def encode(v):
+    if isinstance(v, datetime):
+        return {"datetime": v.isoformat()}
+    if isinstance(v, date):
+        return {"date": v.isoformat()}
+    return v
+
+
+def decode(v):
+    if isinstance(v, dict):
+        if "datetime" in v:
+            return datetime.fromisoformat(v["datetime"])
+        if "date" in v:
+            return datetime.fromisoformat(v["date"])
+    return v
+
+
+def load_state(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def mark_is_timestamp(cursor, sql, column):
+    """Is `column` an Oracle TIMESTAMP (without time zone)? Describes the query without fetching."""
+    cursor.execute(f"SELECT q.{column} FROM ({sql}) q WHERE 1 = 0")
+    type_code = cursor.description[0][1]
+    cursor.fetchall()
+    return getattr(type_code, "name", "") == "DB_TYPE_TIMESTAMP"
+
+
+def incremental_query(sql, column, tiebreak=None, state=None, timestamp=False):
+    """
+    Wrap `sql` so rows come back ordered by the mark and start after the
+    saved one. Without a unique `tiebreak`, rows that share the last mark
+    value with the previous batch would be skipped, so only use a bare
+    column when it is unique (a sequence id, an insert timestamp with
+    enough precision). With `timestamp` the rows carry a trailing
+    MARK_ALIAS column (see data_width()).
+
+    Rows with a NULL mark are never exported: Oracle sorts them last, and
+    a NULL checkpoint would match nothing on every later run.
+    """
+    order = f"q.{column}, q.{tiebreak}" if tiebreak else f"q.{column}"
+    select = f"q.*, TO_CHAR(q.{column}, '{TS_FORMAT}') {MARK_ALIAS}" if timestamp else "*"
+    mark = state and state.get("mark")
+    if not mark:
+        return f"SELECT {select} FROM ({sql}) q WHERE q.{column} IS NOT NULL ORDER BY {order}", {}
+    if mark[0] is None:
+        raise SystemExit(f"saved watermark for {column} is NULL, so no later row can follow it; "
+                         f"set a real mark in the state file or start a full export")
+
+    wm = decode(mark[0])
+    if timestamp and isinstance(wm, datetime):
+        # state written before marks were kept at full precision
+        wm = wm.strftime("%Y-%m-%d %H:%M:%S.%f")
+    bound = f"TO_TIMESTAMP(:wm, '{TS_FORMAT}')" if timestamp else ":wm"
+
+    params = {"wm": wm}
+    if tiebreak:
+        params["wm_tb"] = decode(mark[1])
+        where = f"q.{column} > {bound} OR (q.{column} = {bound} AND q.{tiebreak} > :wm_tb)"
+    else:
+        where = f"q.{column} > {bound}"
+    return f"SELECT {select} FROM ({sql}) q WHERE {where} ORDER BY {order}", params
+
+
+def mark_columns(description, column, tiebreak=None):
+    """Row indexes of the mark columns in a cursor description."""
+    names = [d[0].upper() for d in description]
+    try:
+        idx = [names.index(c.upper()) for c in (column, tiebreak) if c]
+    except ValueError:
+        raise SystemExit(f"watermark column {column}/{tiebreak} is not in the query's select list")
+    if names[-1] == MARK_ALIAS:
+        idx[0] = len(names) - 1
+    return idx
+
+
+def data_width(description):
+    """Number of leading columns that belong to the export (all but MARK_ALIAS)."""
+    return len(description) - (description[-1][0].upper() == MARK_ALIAS)
+
+
+def row_mark(row, idx):
+    return [encode(row[i]) for i in idx]
+
+
+class CheckpointedCsv:
+    """
+    Append-only CSV output that checkpoints the watermark after each batch.
+    .csv.gz / .csv.zst outputs get one compressed member / frame per batch.
+    gzip readers handle that by default; zstandard readers (and so pandas)
+    stop after the first frame unless read_across_frames=True, so read .zst
+    outputs with open_output().
+    """
+
+    def __init__(self, path, header, state_path, column, tiebreak=None, state=None, level=6):
+        self.path = path
+        self.state_path = state_path
+        self.state = state or {}
+        self.state.update(output=path, column=column, tiebreak=tiebreak)
+        self.state.setdefault("rows", 0)
+
+        lower = path.lower()
+        self.compress = (
+            (lambda b: gzip.compress(b, compresslevel=level)) if lower.endswith(".gz") else
+            _zstd_compressor(level) if lower.endswith(".zst") else
+            None
+        )
+
+        offset = self.state.get("offset", 0)
+        size = os.path.getsize(path) if os.path.exists(path) else -1
+        if offset and size < offset:
+            # truncate() would pad a missing or shortened file with NULs
+            raise SystemExit(
+                f"{path} is {'missing' if size < 0 else f'only {size:,} bytes'} but {state_path} "
+                f"checkpointed {offset:,} bytes; restore the file or delete the state file for a full export"
+            )
+        if offset and size > offset:
+            print(f"Discarding {size - offset:,} bytes written after the last checkpoint")
+        self.f = open(path, "r+b" if os.path.exists(path) else "wb")
+        self.f.truncate(offset)
+        self.f.seek(offset)
+        if offset == 0:
+            self._append([header])
+
+    def _append(self, rows):
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        data = buf.getvalue().encode("utf-8")
+        self.f.write(self.compress(data) if self.compress else data)
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def write(self, rows, mark):
+        """Append `rows` and move the mark to `mark` (the last fetched row's)."""
+        if rows:
+            self._append(rows)
+        self.state["rows"] += len(rows)
+        self.state["mark"] = mark
+        self.state["offset"] = self.f.tell()
+        self.state["updated_utc"] = datetime.utcnow().isoformat()
+        save_state(self.state_path, self.state)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_output(path):
+    """Text reader for a CheckpointedCsv output, reading every gzip member / zstd frame."""
+    lower = path.lower()
+    if lower.endswith(".gz"):
+        return gzip.open(path, "rt", newline="", encoding="utf-8")
+    if lower.endswith(".zst"):
+        import zstandard
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True)
+        return io.TextIOWrapper(reader, encoding="utf-8", newline="")
+    return open(path, newline="", encoding="utf-8")
+
+
+def _zstd_compressor(level):
+    import zstandard
+    return zstandard.ZstdCompressor(level=level).compress
+
+
+def check_state(state, column, tiebreak, output):
+    """Refuse to resume a state file written for a different mark or output."""
+    if not state:
+        return
+    if (state.get("column"), state.get("tiebreak"), state.get("output")) != (column, tiebreak, output):
+        raise SystemExit(
+            f"state file was written for column={state.get('column')} tiebreak={state.get('tiebreak')} "
+            f"output={state.get('output')}; delete it to start a full export"
+        )